@@ -1,18 +1,39 @@
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
+from functools import lru_cache
 from xml.dom.minidom import parseString
+from xml.parsers import expat
 from jinja2 import Template
+from qgs_delta import QgsContentDelta
+from qgs_verifier import QgsVerifier
+from qgs_writer import QgsFragments, QgsWriter
 
 import argparse
+import asyncio
 import json
 import os
 import base64
+import hashlib
 import html
 import uuid
 import re
 import requests
+import tempfile
+import threading
 import jsonschema
 import logging
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# dir of the QGS templates and default styles shipped with json2qgs
+BUNDLED_TEMPLATE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'qgs')
 
 
 class Logger():
@@ -46,6 +67,74 @@ class Logger():
         return datetime.now()
 
 
+class Progress():
+    """Periodic progress reporting with ETA
+
+    The ETA is extrapolated from the estimated cost of the processed items
+    instead of their number, as the costs of layers differ by orders of
+    magnitude.
+    """
+
+    def __init__(self, logger, total, total_cost, interval):
+        """Constructor
+
+        :param Logger logger: Logger
+        :param int total: Number of items
+        :param int total_cost: Estimated cost of all items
+        :param float interval: Minimum interval between progress lines
+                               in seconds
+        """
+        self.logger = logger
+        self.total = total
+        self.total_cost = total_cost
+        self.interval = interval
+
+        self.done = 0
+        self.done_cost = 0
+        self.start = logger.timestamp()
+        self.last_report = self.start
+        self.reported = False
+
+    def update(self, cost):
+        """Add processed item and report progress if the interval has
+        elapsed.
+
+        :param int cost: Estimated cost of item
+        """
+        self.done += 1
+        self.done_cost += cost
+
+        now = self.logger.timestamp()
+        if self.done < self.total and \
+                (now - self.last_report).total_seconds() >= self.interval:
+            self.last_report = now
+            self.report(now)
+
+    def report(self, now):
+        """Log progress line with ETA.
+
+        :param datetime now: Current time
+        """
+        elapsed = (now - self.start).total_seconds()
+        remaining = max(0, self.total_cost - self.done_cost)
+        eta = elapsed * remaining / max(1, self.done_cost)
+
+        self.logger.info(
+            "Collected %d/%d layers (%.0f%% of estimated cost), "
+            "ETA %.0f s" % (
+                self.done, self.total,
+                100.0 * self.done_cost / max(1, self.total_cost), eta))
+        self.reported = True
+
+    def finish(self):
+        """Log total duration if progress has been reported."""
+        if self.reported:
+            self.logger.info(
+                "Collected %d layers in %.1f s" % (
+                    self.done,
+                    (self.logger.timestamp() - self.start).total_seconds()))
+
+
 class Json2Qgs():
     """Json2Qgs class
 
@@ -55,8 +144,40 @@ class Json2Qgs():
     # default extent for WMS and layers if not set in config
     DEFAULT_EXTENT = [2590983, 1212806, 2646267, 1262755]
 
+    # decoded print templates by content hash, shared by all projects
+    # of the process, least recently used templates are evicted
+    print_template_cache = OrderedDict()
+    print_template_cache_lock = threading.Lock()
+
+    # max number of cached print templates
+    PRINT_TEMPLATE_CACHE_SIZE = 64
+
+    # number of layers per chunk for parallel rendering
+    RENDER_CHUNK_SIZE = 25
+
+    # pooled HTTP session for schema downloads, shared by all projects
+    http_session = requests.Session()
+
+    # chunk size for decoding compressed payloads (multiple of 4)
+    DECODE_CHUNK_SIZE = 64 * 1024
+
+    # placeholder for the alias table in parsed QML styles
+    ALIASES_PLACEHOLDER = "json2qgs:aliases"
+
+    # estimated cost of a QML asset in bytes of payload, for scheduling
+    ASSET_COST = 16 * 1024
+
+    # minimum interval between progress lines in seconds
+    PROGRESS_INTERVAL = 10
+
+    # version of the rendered layer fragments, increase on any change of
+    # the collected layer infos or rendered output to invalidate the
+    # fragment cache
+    FRAGMENT_CACHE_VERSION = 1
+
     def __init__(self, config, logger, dest_path, qgis_version,
-                 qgs_template_dir, qgs_name):
+                 qgs_template_dir, qgs_name, verify=False, cache_dir=None,
+                 workers=1, delta=None, wfs_fast=False, renderer='jinja'):
         """Constructor
 
         :param obj config: Json2Qgs config
@@ -66,6 +187,17 @@ class Json2Qgs():
         :param str qgs_template_dir: Path to the qgs template dir where the
                    default QMLs and QGIS template files should exist
         :param str qgs_name: Target base name of generated QGS files
+        :param bool verify: Whether to verify the structure of generated
+                            QGS files
+        :param str cache_dir: Optional path to the cache dir for rendered
+                              layer fragments
+        :param int workers: Number of worker processes for collecting and
+                            rendering layers
+        :param QgsContentDelta delta: Delta which has been applied to config,
+                                      to regenerate only affected layers
+        :param bool wfs_fast: Whether to write minimal styles with only the
+                              aliases for WFS projects
+        :param str renderer: Backend for writing QGS files: [jinja | xml]
         """
         self.logger = logger
 
@@ -98,6 +230,23 @@ class Json2Qgs():
             self.qgs_template_fn = os.path.join(
                 qgs_template_dir, 'service_2.qgs')
 
+        # the XML writer is only available for QGIS 3 and writes the
+        # project of the bundled template, custom templates are rendered
+        # with jinja
+        self.renderer = renderer
+        if renderer == 'xml' and qgis_version != '3':
+            self.logger.warning(
+                "XML renderer is only available for QGIS 3, using jinja")
+            self.renderer = 'jinja'
+        elif renderer == 'xml' and \
+                not self.is_bundled_template(self.qgs_template_fn):
+            self.logger.warning(
+                "XML renderer only supports the bundled template %s, "
+                "using jinja for custom template %s" % (
+                    os.path.join(BUNDLED_TEMPLATE_DIR, 'service_3.qgs'),
+                    self.qgs_template_fn))
+            self.renderer = 'jinja'
+
         if not os.path.exists(self.qgs_template_fn):
             self.can_generate = False
             self.logger.error(
@@ -120,6 +269,83 @@ class Json2Qgs():
 
         self.wms_top_layers = config.get("wms_top_layers", [])
 
+        self.verify = verify
+
+        # WFS fast mode without symbology and assets
+        self.wfs_fast = wfs_fast
+
+        # layers not reachable from the WMS top layers
+        self.pruned_layers = []
+
+        # rendered layer fragments are cached by layer content, cache
+        # version, QGIS version, QGS template and default styles
+        self.fragment_cache_dir = None
+        if cache_dir is not None and self.can_generate:
+            self.fragment_cache_dir = os.path.abspath(cache_dir)
+            os.makedirs(self.fragment_cache_dir, exist_ok=True)
+
+            salt = hashlib.sha256()
+            salt.update(
+                ("v%d" % self.FRAGMENT_CACHE_VERSION).encode('utf-8'))
+            salt.update(qgis_version.encode('utf-8'))
+            if self.renderer == 'jinja':
+                # the XML writer does not depend on the template
+                salt.update(
+                    self.load_template(self.qgs_template_fn).encode('utf-8'))
+            for name in sorted(self.default_styles):
+                salt.update(self.default_styles[name].encode('utf-8'))
+            salt.update(json.dumps(self.default_extent).encode('utf-8'))
+            if self.wfs_fast:
+                salt.update(b'wfs_fast')
+            if self.renderer != 'jinja':
+                salt.update(self.renderer.encode('utf-8'))
+            self.fragment_cache_salt = salt.hexdigest()
+        self.fragment_cache_hits = 0
+        self.fragment_cache_misses = 0
+
+        self.workers = max(1, workers)
+
+        # delta mode
+        self.delta = delta
+        # manifest of a previous generation, with fragment cache keys
+        # of the layers in the project
+        self.manifest_path = os.path.join(
+            self.project_output_dir, "%s.manifest.json" % qgs_name)
+        self.delta_manifest = None
+        # cache keys of layers unchanged by the delta by name
+        self.known_cache_keys = {}
+        # cache keys of collected layers by name
+        self.layer_cache_keys = {}
+        # names of layers and productsets in the project
+        self.project_layer_names = []
+
+        # fragment cache keys by layer config id
+        self.fragment_cache_keys = {}
+        # layers collected on workers by name, without layer IDs
+        self.scheduled_layers = {}
+        # progress of layer collection
+        self.progress = None
+
+        # set if an async generation has been cancelled or timed out
+        self.cancelled = False
+        # estimated costs of layers to collect by name
+        self.layer_costs = {}
+
+    def is_bundled_template(self, path):
+        """Check whether a QGS template is identical to the bundled one.
+
+        :param str path: Path to template file
+        return bool bundled : Return true if template has the same content
+                              as the bundled template of the same name
+        """
+        bundled_path = os.path.join(
+            BUNDLED_TEMPLATE_DIR, os.path.basename(path))
+        try:
+            with open(path, 'rb') as f, open(bundled_path, 'rb') as bundled:
+                return f.read() == bundled.read()
+        except OSError:
+            return False
+
     def load_template(self, path):
         """Load contents of QGIS template file.
 
@@ -143,43 +369,67 @@ class Json2Qgs():
         attr = " ".join(['%s="%s"' % entry for entry in filter(
             lambda entry: entry[0] != "version", qgis.attributes.items())])
 
-        # update aliases
+        # replace <aliases> with alias table from layer config
+        # NOTE: <aliases> is not added if missing in QML
+        aliases_xml = None
         if attributes:
             aliases = qgis.getElementsByTagName("aliases")
-            if not aliases:
-                # create <aliases>
-                aliases = doc.createElement("aliases")
-            else:
-                # get <aliases>
+            if aliases:
                 aliases = aliases[0]
+                aliases.parentNode.replaceChild(
+                    doc.createComment(self.ALIASES_PLACEHOLDER), aliases)
+                aliases.unlink()
+                aliases_xml = self.aliases_xml(attributes)
 
-            # remove existing aliases
-            for alias in list(aliases.childNodes):
-                aliases.removeChild(alias)
+        style = "".join([node.toxml() for node in qgis.childNodes])
+        if aliases_xml is not None:
+            style = style.replace(
+                "<!--%s-->" % self.ALIASES_PLACEHOLDER, aliases_xml, 1)
 
-            # add aliases from layer config
-            for i, attribute in enumerate(attributes):
-                # get alias from from alias data
-                attr_alias = attribute.get("alias", "")
-                try:
-                    if attr_alias.startswith('{'):
-                        # parse JSON
-                        json_config = json.loads(attr_alias)
-                        attr_alias = json_config.get('alias', attr_alias)
-                except Exception as e:
-                    self.logger.warning(
-                        "Could not parse value as JSON: '%s'\n%s" %
-                        (attr_alias, e)
-                    )
+        return {"attr": attr, "style": style}
 
-                alias = doc.createElement("alias")
-                alias.setAttribute('field', attribute["name"])
-                alias.setAttribute('index', str(i))
-                alias.setAttribute('name', attr_alias)
-                aliases.appendChild(alias)
+    def attribute_alias(self, attribute):
+        """Return alias of an attribute from its alias data.
 
-        style = "".join([node.toxml() for node in qgis.childNodes])
-        return {"attr": attr, "style": style}
+        :param dict attribute: Attribute config with optional alias, which
+                               may be a JSON config with an alias
+        return str alias : Attribute alias
+        """
+        # get alias from from alias data
+        attr_alias = attribute.get("alias", "")
+        try:
+            if attr_alias.startswith('{'):
+                # parse JSON once per distinct alias
+                attr_alias = parse_json_alias(attr_alias)
+        except Exception as e:
+            self.logger.warning(
+                "Could not parse value as JSON: '%s'\n%s" %
+                (attr_alias, e)
+            )
+
+        return attr_alias
+
+    def aliases_xml(self, attributes):
+        """Return <aliases> block from the alias table of the attributes.
+
+        :param list attributes: attributes list used to set aliases
+        return str aliases : <aliases> XML
+        """
+        aliases = [
+            '<alias field="%s" index="%d" name="%s"/>' % (
+                html.escape(attribute["name"]), i,
+                html.escape(self.attribute_alias(attribute)))
+            for i, attribute in enumerate(attributes)
+        ]
+        return "<aliases>%s</aliases>" % "".join(aliases)
+
+    def aliases_style(self, attributes):
+        """Return minimal style with only the aliases of the attributes.
+
+        :param list attributes: attributes list used to set aliases
+        return dict {"attr": data, "style": data}
+        """
+        return {"attr": "", "style": self.aliases_xml(attributes)}
 
     def path_is_child(self, parent_path, child_path):
         """Checks wheter child_path is a subdir in parent_path
@@ -237,10 +487,333 @@ class Json2Qgs():
             }
         else:
             # single layer
-            layer_info = self.collect_single_layer(layer, True)
+            layer_info = self.collect_cached_layer(layer, True)
 
         return layer_info
 
+    def collect_cached_layer(self, layer, is_wms):
+        """Collect single layer info, using cached rendered fragments
+        if available.
+
+        The cached fragments contain the layer ID, so they are only used
+        for the first occurrence of a layer in the project. Further
+        occurrences in other productsets get their own layer ID and are
+        rendered without cache.
+
+        :param dict layer: Data layer dictionary
+        :param bool is_wms: Whether mode is WMS or WFS
+        """
+        if self.fragment_cache_dir is None or \
+                layer["name"] in self.layer_cache_keys:
+            return self.collect_scheduled_layer(layer, is_wms)
+
+        key = self.fragment_cache_key(layer)
+        self.layer_cache_keys[layer["name"]] = key
+
+        cached = None
+        cache_path = os.path.join(self.fragment_cache_dir, "%s.json" % key)
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, encoding='utf-8') as f:
+                    cached = json.load(f)
+            except Exception as e:
+                self.logger.warning(
+                    "Could not load cached fragments %s:\n%s" % (
+                        cache_path, e))
+
+        if cached is None:
+            self.fragment_cache_misses += 1
+            qgs_layer = self.collect_scheduled_layer(layer, is_wms)
+            if qgs_layer.pop("fallback_style", False):
+                # do not cache default style, as the style could not be
+                # decoded due to a possibly temporary failure
+                self.layer_cache_keys[layer["name"]] = None
+            else:
+                qgs_layer["cache_key"] = key
+            return qgs_layer
+
+        self.fragment_cache_hits += 1
+        self.logger.debug("Using cached fragments for '%s'" % layer["name"])
+
+        # assets are not part of the cached fragments,
+        # but have already been saved for layers unchanged by a delta
+        if layer["name"] not in self.known_cache_keys and \
+                not (self.wfs_fast and not is_wms):
+            self.save_qml_assets(layer, "")
+        self.update_progress(layer)
+
+        return {
+            "type": "layer",
+            "name": cached["name"],
+            "title": cached["title"],
+            "id": cached["id"],
+            "fragments": cached["fragments"]
+        }
+
+    def fragment_cache_key(self, layer):
+        """Return fragment cache key of a layer.
+
+        :param dict layer: Data layer dictionary
+        return str key : Hash of layer config and cache salt
+        """
+        # layers unchanged by a delta keep their key from the manifest
+        key = self.known_cache_keys.get(layer["name"])
+        if key is None:
+            key = self.layer_digest(layer)
+
+        return key
+
+    def layer_digest(self, layer):
+        """Return hash of a layer config and the cache salt.
+
+        NOTE: memoized by object identity, as layers unchanged by a delta
+              are shared by the base and the patched config
+
+        :param dict layer: Layer config
+        return str digest : Hash of layer config and cache salt
+        """
+        digest = self.fragment_cache_keys.get(id(layer))
+        if digest is None:
+            digest = hashlib.sha256(
+                (self.fragment_cache_salt + json.dumps(layer, sort_keys=True))
+                .encode('utf-8')
+            ).hexdigest()
+            self.fragment_cache_keys[id(layer)] = digest
+
+        return digest
+
+    def config_digest(self, config):
+        """Return hash of a full config, to check whether a delta is applied
+        to the config of the previous generation.
+
+        :param dict config: qgsContent config
+        return str digest : Hash of config and cache salt
+        """
+        layers = config.get("layers")
+        if isinstance(layers, list):
+            other = {
+                key: value for key, value in config.items() if key != "layers"
+            }
+        else:
+            other = config
+            layers = []
+        digest = hashlib.sha256(
+            json.dumps(other, sort_keys=True).encode('utf-8'))
+        for layer in layers:
+            digest.update(self.layer_digest(layer).encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def collect_scheduled_layer(self, layer, is_wms):
+        """Collect single layer info, using the layer collected on a worker
+        if available.
+
+        :param dict layer: Data layer dictionary
+        :param bool is_wms: Whether mode is WMS or WFS
+        """
+        qgs_layer = self.scheduled_layers.pop(layer["name"], None)
+        if qgs_layer is None:
+            qgs_layer = self.collect_single_layer(layer, is_wms)
+            self.update_progress(layer)
+        else:
+            # assign layer IDs in layer tree order, as in sequential mode
+            qgs_layer["id"] = str(uuid.uuid4())
+
+        return qgs_layer
+
+    def schedule_layers(self, layers, is_wms):
+        """Start progress reporting and collect single layers on worker
+        processes, if more than one worker is configured.
+
+        Layer costs are very uneven, so the layers are submitted in order
+        of their estimated cost, starting with the largest. The layer tree
+        is built from the collected layers afterwards in config order.
+        Layers with cached fragments are not scheduled.
+
+        :param list layers: Layer configs of the project
+        :param bool is_wms: Whether mode is WMS or WFS
+        """
+        single_layers = OrderedDict()
+        for layer in layers:
+            if isinstance(layer, dict) and \
+                    layer.get("type") != 'productset' and \
+                    layer.get("name") not in single_layers:
+                single_layers[layer.get("name")] = layer
+
+        self.layer_costs = {
+            name: self.estimated_layer_cost(layer)
+            for name, layer in single_layers.items()
+        }
+        self.progress = Progress(
+            self.logger, len(single_layers), sum(self.layer_costs.values()),
+            self.PROGRESS_INTERVAL)
+
+        if self.workers < 2:
+            return
+
+        pending = [
+            layer for layer in single_layers.values()
+            if self.fragment_cache_dir is None or not os.path.exists(
+                os.path.join(
+                    self.fragment_cache_dir,
+                    "%s.json" % self.fragment_cache_key(layer)))
+        ]
+        if len(pending) < 2:
+            return
+
+        pending = self.schedule_order(pending)
+        self.logger.debug(
+            "Collecting %d layers on %d workers, largest first" % (
+                len(pending), self.workers))
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=init_collect_worker,
+            initargs=(self, is_wms)
+        ) as executor:
+            futures = {
+                executor.submit(collect_layer, layer): layer
+                for layer in pending
+            }
+            for future in as_completed(futures):
+                if self.cancelled:
+                    for pending_future in futures:
+                        pending_future.cancel()
+                    return
+                layer = futures[future]
+                self.scheduled_layers[layer["name"]] = future.result()
+                self.update_progress(layer)
+
+    def schedule_order(self, layers):
+        """Return layers sorted by estimated cost, largest first.
+
+        Layers with equal cost keep their order.
+
+        :param list layers: Layer configs
+        return list layers : Sorted layer configs
+        """
+        return sorted(layers, key=self.estimated_layer_cost, reverse=True)
+
+    def estimated_layer_cost(self, layer):
+        """Return estimated cost for collecting a single layer.
+
+        The cost is dominated by decoding and parsing the QML and writing
+        the assets, so it is estimated from the payload size and the number
+        of assets.
+
+        :param dict layer: Data layer dictionary
+        return int cost : Estimated cost in bytes of payload
+        """
+        assets = layer.get("qml_assets") or []
+        return 1 + self.layer_payload_size(layer) + \
+            self.ASSET_COST * len(assets)
+
+    def update_progress(self, layer):
+        """Add collected layer to progress, if it has not been collected
+        before.
+
+        :param dict layer: Data layer dictionary
+        """
+        if self.progress is None:
+            return
+
+        cost = self.layer_costs.pop(layer["name"], None)
+        if cost is not None:
+            self.progress.update(cost)
+
+    def finish_progress(self):
+        """Finish progress reporting of layer collection."""
+        if self.progress is not None:
+            self.progress.finish()
+            self.progress = None
+
+    def render_layer_fragments(self, qgis_template, binding):
+        """Render fragments of all layers in the layer tree which have not
+        been loaded from the fragment cache and add them to the cache.
+
+        If more than one worker is configured, the layers are rendered in
+        fixed-size chunks on a process pool. The chunks are collected in
+        layer tree order, so the result is identical to rendering them
+        sequentially.
+
+        :param str qgis_template: QGS template with layer macros
+        :param dict binding: Dict for jinja
+        """
+        layers = []
+        self.collect_unrendered_layers(binding['layertree'], layers)
+
+        # evaluate template without layers to get the layer macros
+        macros_binding = dict(binding, layertree=[], wfs_layers=[],
+                              composers=[])
+
+        fragments = []
+        if layers and self.workers > 1:
+            chunks = [
+                layers[i:i + self.RENDER_CHUNK_SIZE]
+                for i in range(0, len(layers), self.RENDER_CHUNK_SIZE)
+            ]
+            self.logger.debug(
+                "Rendering %d layers in %d chunks on %d workers" % (
+                    len(layers), len(chunks), self.workers))
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=init_fragment_worker,
+                initargs=(qgis_template, macros_binding, self.renderer)
+            ) as executor:
+                for chunk_fragments in executor.map(render_fragments, chunks):
+                    fragments += chunk_fragments
+        elif layers:
+            macros = fragment_renderer(
+                qgis_template, macros_binding, self.renderer)
+            fragments = [
+                layer_fragments(macros, layer) for layer in layers
+            ]
+
+        for layer, layer_fragment in zip(layers, fragments):
+            layer["fragments"] = layer_fragment
+            if "cache_key" in layer:
+                self.cache_layer_fragments(layer)
+
+        if self.fragment_cache_dir is not None:
+            self.logger.info(
+                "Fragment cache: %d hits, %d misses" % (
+                    self.fragment_cache_hits, self.fragment_cache_misses))
+
+    def cache_layer_fragments(self, layer):
+        """Add rendered fragments of a layer to the fragment cache.
+
+        :param dict layer: QGS layer with rendered fragments
+        """
+        cached = {
+            "name": layer["name"],
+            "title": layer["title"],
+            "id": layer["id"],
+            "fragments": layer["fragments"]
+        }
+        try:
+            # write to temp file and rename to avoid partial cache files
+            fd, tmp_path = tempfile.mkstemp(
+                dir=self.fragment_cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(cached, f)
+            os.replace(tmp_path, os.path.join(
+                self.fragment_cache_dir, "%s.json" % layer["cache_key"]))
+        except Exception as e:
+            self.logger.warning(
+                "Could not cache fragments for '%s':\n%s" % (
+                    layer["name"], e))
+
+    def collect_unrendered_layers(self, layertree, layers):
+        """Recursively collect single layers without rendered fragments.
+
+        :param list layertree: QGS layer tree
+        :param list layers: Collected layers
+        """
+        for item in layertree:
+            if item["type"] == 'productset':
+                self.collect_unrendered_layers(item["items"], layers)
+            elif "fragments" not in item:
+                layers.append(item)
+
     def collect_single_layer(self, layer, is_wms):
         """Collect single layer info for layersubtree from qgsContent.
 
@@ -282,9 +855,17 @@ class Json2Qgs():
                     geometry_column=datasource["geometry_field"]
                     )
                 )
+            if not is_wms and self.wfs_fast:
+                # WFS fast mode: skip symbology and assets
+                qml = self.aliases_style(layer.get("attributes", []))
+                qgs_layer["style"] = qml["style"]
+                qgs_layer["attributes"] = qml["attr"]
+                return qgs_layer
+
             try:
                 qml = self.get_qml_from_base64(
-                    layer["qml_base64"], layer.get("attributes", []))
+                    layer["qml_base64"], layer.get("attributes", []),
+                    layer.get("qml_compression"))
                 qgs_layer["style"] = qml["style"]
                 qgs_layer["attributes"] = qml["attr"]
 
@@ -300,46 +881,11 @@ class Json2Qgs():
                     layer.get("attributes", []))
                 qgs_layer["style"] = qml["style"]
                 qgs_layer["attributes"] = qml["attr"]
+                qgs_layer["fallback_style"] = True
 
             if "qml_assets" in layer_keys:
-                # Iterate through all assets used in the QML and save them
-                # in the filesystem
-                # If the asset path defines directories that do not exist,
-                # then create those directories and save the asset image
-                for asset in layer["qml_assets"]:
-                    try:
-                        # save asset in additional subdir named after layer
-                        # i.e. <project_output_dir>/<layer name>/<asset path>
-                        rel_asset_path = os.path.join(
-                            layer["name"], asset["path"]
-                        )
-                        asset_path = os.path.join(
-                            self.project_output_dir, rel_asset_path
-                        )
-                        if self.path_is_child(self.project_output_dir, asset_path):
-                            os.makedirs(
-                                os.path.dirname(asset_path), exist_ok=True)
-                            with open(asset_path, "wb") as fh:
-                                fh.write(
-                                    base64.b64decode(asset["base64"]))
-
-                            # update relative symbol paths in QML
-                            pattern = "v=\"%s\"" % asset["path"]
-                            replacement = "v=\"%s\"" % rel_asset_path
-                            qgs_layer["style"] = qgs_layer["style"].replace(
-                                pattern, replacement
-                            )
-                        else:
-                            self.logger.warning(
-                                "[Layer: {}] An error occured when trying "
-                                "to save {}\nAssets can only be"
-                                " saved under {}!".format(
-                                    qgs_layer["name"], asset["path"],
-                                    self.project_output_dir))
-                    except Exception as e:
-                        self.logger.warning(
-                            "[Layer: {}] An error occured when trying to save {}\n{}".format(
-                                qgs_layer["name"], asset["path"], str(e)))
+                qgs_layer["style"] = self.save_qml_assets(
+                    layer, qgs_layer["style"])
 
         elif "raster_datasource" in layer_keys:
             # TODO: srid is not used here?
@@ -350,7 +896,8 @@ class Json2Qgs():
 
             try:
                 qml = self.get_qml_from_base64(
-                    layer["qml_base64"], layer.get("attributes", []))
+                    layer["qml_base64"], layer.get("attributes", []),
+                    layer.get("qml_compression"))
                 qgs_layer["style"] = qml["style"]
                 qgs_layer["attributes"] = qml["attr"]
 
@@ -363,6 +910,7 @@ class Json2Qgs():
                     layer.get("attributes", []))
                 qgs_layer["style"] = qml["style"]
                 qgs_layer["attributes"] = qml["attr"]
+                qgs_layer["fallback_style"] = True
 
         elif "wms_datasource" in layer_keys:
             # Constant value
@@ -418,17 +966,171 @@ class Json2Qgs():
 
         return qgs_layer
 
-    def get_qml_from_base64(self, base64_qml, attributes):
+    def save_qml_assets(self, layer, style):
+        """Save QML assets of a layer and update their paths in the style.
+
+        param dict layer: Data layer dictionary
+        param str style: Parsed QML style of the layer
+        return str style : Style with updated relative symbol paths
+        """
+        # Iterate through all assets used in the QML and save them
+        # in the filesystem
+        # If the asset path defines directories that do not exist,
+        # then create those directories and save the asset image
+        for asset in layer.get("qml_assets", []):
+            try:
+                # save asset in additional subdir named after layer
+                # i.e. <project_output_dir>/<layer name>/<asset path>
+                rel_asset_path = os.path.join(
+                    layer["name"], asset["path"]
+                )
+                asset_path = os.path.join(
+                    self.project_output_dir, rel_asset_path
+                )
+                if self.path_is_child(self.project_output_dir, asset_path):
+                    self.save_asset(
+                        asset_path, asset["base64"], asset.get("compression"))
+
+                    # update relative symbol paths in QML
+                    pattern = "v=\"%s\"" % asset["path"]
+                    replacement = "v=\"%s\"" % rel_asset_path
+                    style = style.replace(pattern, replacement)
+                else:
+                    self.logger.warning(
+                        "[Layer: {}] An error occured when trying "
+                        "to save {}\nAssets can only be"
+                        " saved under {}!".format(
+                            layer["name"], asset["path"],
+                            self.project_output_dir))
+            except Exception as e:
+                self.logger.warning(
+                    "[Layer: {}] An error occured when trying to save {}\n{}".format(
+                        layer["name"], asset["path"], str(e)))
+
+        return style
+
+    def save_asset(self, asset_path, base64_asset, compression=None):
+        """Decode base64_asset and save it, unless an identical file
+        already exists.
+
+        param str asset_path: Absolute target path of asset
+        param str base64_asset: Asset encoded with base64
+        param str compression: Optional compression of asset [gzip | zstd]
+        return bool written : Return true if the file has been written
+        """
+        data = self.decode_base64(base64_asset, compression)
+
+        if os.path.isfile(asset_path) and \
+                os.path.getsize(asset_path) == len(data):
+            with open(asset_path, "rb") as fh:
+                if fh.read() == data:
+                    self.logger.debug("Unchanged asset %s" % asset_path)
+                    return False
+
+        os.makedirs(os.path.dirname(asset_path), exist_ok=True)
+        with open(asset_path, "wb") as fh:
+            fh.write(data)
+
+        return True
+
+    def decode_print_template(self, base64_template, compression=None):
+        """Decode base64_template with base64 and check it is well-formed.
+
+        Each unique template is only decoded and checked once and then
+        served from the print template cache, as long as it is among the
+        most recently used templates.
+
+        param str base64_template: QPT encoded with base64
+        param str compression: Optional compression of QPT [gzip | zstd]
+        return str template : Decoded QPT or None if invalid
+        """
+        key = hashlib.sha256(
+            ("%s:%s" % (compression, base64_template)).encode('utf-8')
+        ).hexdigest()
+
+        with self.print_template_cache_lock:
+            cached = self.print_template_cache.get(key)
+            if cached is not None:
+                self.print_template_cache.move_to_end(key)
+
+        if cached is None:
+            template = None
+            error = None
+            try:
+                template = self.decode_base64(
+                    base64_template, compression).decode("utf-8")
+                # check well-formedness without building a DOM
+                expat.ParserCreate().Parse(template, True)
+            except Exception as e:
+                template = None
+                error = str(e)
+
+            with self.print_template_cache_lock:
+                self.print_template_cache[key] = (template, error)
+                while len(self.print_template_cache) > \
+                        self.PRINT_TEMPLATE_CACHE_SIZE:
+                    self.print_template_cache.popitem(last=False)
+        else:
+            self.logger.debug("Using cached print template %s" % key[:12])
+            template, error = cached
+
+        if template is None:
+            self.logger.error(
+                "Error trying to decode print template!\n%s" % error)
+
+        return template
+
+    def get_qml_from_base64(self, base64_qml, attributes, compression=None):
         """Decode base64_qml with base64 and return the parsed qml style
 
         param str base64_qml: QML encoded with base64
         param list attributes: attributes list used to set aliases in the QML
+        param str compression: Optional compression of QML [gzip | zstd]
         return dict {"attr": data, "style": data}
         """
 
-        qml = base64.b64decode(base64_qml).decode("utf-8")
+        qml = self.decode_base64(base64_qml, compression).decode("utf-8")
         return self.parse_qml_style(qml, attributes)
 
+    def decode_base64(self, base64_data, compression=None):
+        """Decode base64_data with base64 and decompress it if compressed.
+
+        Compressed payloads are decoded and decompressed in chunks, without
+        holding the whole compressed payload in memory.
+
+        param str base64_data: Data encoded with base64
+        param str compression: Optional compression of data [gzip | zstd]
+        return bytes data : Decoded data
+        """
+        if compression is None:
+            return base64.b64decode(base64_data)
+
+        if compression == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif compression == 'zstd':
+            if zstandard is None:
+                raise ValueError(
+                    "Python package 'zstandard' is required for zstd "
+                    "compressed payloads")
+            decompressor = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            raise ValueError("Unsupported compression '%s'" % compression)
+
+        if '\n' in base64_data:
+            # remove line breaks to keep chunks aligned
+            base64_data = "".join(base64_data.split())
+
+        chunks = []
+        for i in range(0, len(base64_data), self.DECODE_CHUNK_SIZE):
+            chunks.append(decompressor.decompress(base64.b64decode(
+                base64_data[i:i + self.DECODE_CHUNK_SIZE])))
+        chunks.append(decompressor.flush())
+
+        if not getattr(decompressor, 'eof', True):
+            raise ValueError("Truncated %s compressed payload" % compression)
+
+        return b"".join(chunks)
+
     def collect_wms_metadata(self, metadata, layertree, composers=[]):
         """Collect wms metadata from qgsContent
 
@@ -516,42 +1218,368 @@ class Json2Qgs():
                                    composers to the project
         """
 
-        if os.path.exists(self.project_output_dir) is False:
-            self.logger.error(
-                "Destination directory ({}) does not exist!".format(
-                    self.project_output_dir))
+        # reset cancellation of a previous generation
+        self.cancelled = False
+
+        if self.check_output_dir() is False:
+            return
+
+        prepared = self.prepare_generation(False)
+        if prepared is None:
             return
+        layers_lookup, layers = prepared
 
-        if self.validate_schema() is False:
+        if self.validate_layers(layers, layers_lookup) is False:
             return
 
         qgis_template = self.load_template(self.qgs_template_fn)
 
-        # collect lookup for layers by name
-        layers_lookup = {}
-        for layer in self.config.get("layers"):
-            layers_lookup[layer["name"]] = layer
+        self.schedule_layers(layers_lookup.values(), True)
 
-        composers = []
         layertree = []
 
         for layer_name in self.wms_top_layers:
             layer_info = self.collect_nested_layer(layer_name, layers_lookup)
             if layer_info:
                 layertree.append(layer_info)
+        self.finish_progress()
+
+        composers = self.collect_print_templates()
+
+        binding = self.collect_wms_metadata(self.config.get(
+            "wms_metadata", {}), layertree, composers=composers)
+        self.write_project(qgis_template, binding, False)
+
+    def generate_wfs_project(self):
+        """Generate WFS project
+
+        """
+
+        # reset cancellation of a previous generation
+        self.cancelled = False
+
+        if self.check_output_dir() is False:
+            return
+
+        prepared = self.prepare_generation(True)
+        if prepared is None:
+            return
+
+        if self.validate_layers(prepared[1]) is False:
+            return
+
+        qgis_template = self.load_template(self.qgs_template_fn)
+        layers = self.config.get("layers")
+
+        self.schedule_layers(layers, False)
+
+        layertree = []
+
+        for layer in layers:
+            self.logger.debug("Adding layer:'%s'" % layer["name"])
+            layertree.append(self.collect_cached_layer(layer, False))
+        self.finish_progress()
+
+        binding = self.collect_wfs_metadata(self.config.get(
+            "wfs_metadata", {}), layertree)
+        self.write_project(qgis_template, binding, True)
+
+    async def generate_async(self, mode, timeout=None):
+        """Generate WMS or WFS project without blocking the event loop.
+
+        The schema is downloaded with the pooled HTTP session, while QML
+        parsing, rendering and all file writes run in the default executor.
+        Layers are collected one top-level layer at a time, so cancelling
+        the generation or exceeding the timeout stops it at the next
+        step. A step already running in the executor is not interrupted
+        and completes in the background, e.g. the collection of a layer
+        with its assets, but the QGS file is not replaced after the
+        generation has been cancelled.
+
+        param str mode: Project type: [wms | wfs]
+        param float timeout: Optional timeout for the generation in seconds
+        return str qgs_path : Path of generated QGS file or None on error
+        """
+        try:
+            return await asyncio.wait_for(
+                self.generate_project_async(mode == 'wfs'), timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            # stop steps still running in the executor from writing the
+            # project
+            self.cancelled = True
+            raise
+
+    async def generate_project_async(self, is_wfs):
+        """Generate WMS or WFS project in stages on the default executor.
+
+        :param bool is_wfs: Whether mode is WMS or WFS
+        return str qgs_path : Path of generated QGS file or None on error
+        """
+        loop = asyncio.get_running_loop()
+
+        # reset cancellation of a previous generation
+        self.cancelled = False
+
+        if self.check_output_dir() is False:
+            return None
+
+        prepared = self.prepare_generation(is_wfs)
+        if prepared is None:
+            # project not affected by delta
+            return self.qgs_path()
+        layers_lookup, layers = prepared
+
+        schema = await loop.run_in_executor(
+            None, self.download_schema, self.config["$schema"])
+        if schema is None:
+            return None
+
+        valid = await loop.run_in_executor(
+            None, self.validate_layers, layers, layers_lookup, schema)
+        if valid is False:
+            return None
+
+        qgis_template = await loop.run_in_executor(
+            None, self.load_template, self.qgs_template_fn)
+
+        await loop.run_in_executor(
+            None, self.schedule_layers,
+            self.config.get("layers") if is_wfs else layers_lookup.values(),
+            not is_wfs)
+
+        layertree = []
+
+        if is_wfs:
+            for layer in self.config.get("layers"):
+                self.logger.debug("Adding layer:'%s'" % layer["name"])
+                layertree.append(await loop.run_in_executor(
+                    None, self.collect_cached_layer, layer, False))
+            self.finish_progress()
+
+            binding = self.collect_wfs_metadata(self.config.get(
+                "wfs_metadata", {}), layertree)
+        else:
+            for layer_name in self.wms_top_layers:
+                layer_info = await loop.run_in_executor(
+                    None, self.collect_nested_layer, layer_name,
+                    layers_lookup)
+                if layer_info:
+                    layertree.append(layer_info)
+            self.finish_progress()
+
+            composers = await loop.run_in_executor(
+                None, self.collect_print_templates)
+
+            binding = self.collect_wms_metadata(self.config.get(
+                "wms_metadata", {}), layertree, composers=composers)
+
+        return await loop.run_in_executor(
+            None, self.write_project, qgis_template, binding, is_wfs)
+
+    def check_output_dir(self):
+        """Check whether the destination directory exists.
+
+        return bool exists : Return true if destination directory exists
+        """
+        if os.path.exists(self.project_output_dir) is False:
+            self.logger.error(
+                "Destination directory ({}) does not exist!".format(
+                    self.project_output_dir))
+            return False
+
+        return True
+
+    def prepare_generation(self, is_wfs):
+        """Collect the layers of the project and the layers to validate.
+
+        In delta mode only layers without cache keys in the manifest of the
+        previous generation are validated, i.e. layers changed by the delta
+        or newly added to the project, and the generation is skipped if the
+        project is not affected.
+
+        :param bool is_wfs: Whether mode is WMS or WFS
+        return tuple (layers_lookup, layers) : Reachable layer configs by
+               name (None for WFS) and layer configs to validate, or None
+               if the project is not affected by the delta
+        """
+        if is_wfs:
+            layers_lookup = None
+            layers = self.config.get("layers")
+            project_layers = layers if isinstance(layers, list) else []
+        else:
+            # only layers reachable from the WMS top layers end up in the
+            # project, skip validation and decoding of all other layers
+            layers_lookup = self.prune_unreachable_layers()
+            layers = list(layers_lookup.values())
+            project_layers = layers
+
+        self.project_layer_names = [
+            layer.get("name") for layer in project_layers
+            if isinstance(layer, dict)
+        ]
+
+        self.delta_manifest = self.load_delta_manifest(is_wfs)
+        if self.delta_manifest is None:
+            return layers_lookup, layers
+
+        if not self.project_affected_by_delta(is_wfs):
+            self.logger.info(
+                "Project %s is not affected by delta, skipping generation" %
+                self.qgs_path())
+            # project is unchanged, but the patched config is the base for
+            # the next delta
+            self.save_manifest(OrderedDict(
+                self.delta_manifest,
+                config_digest=self.config_digest(self.config)))
+            return None
+
+        touched = set(self.delta.changed_layers)
+        touched.update(self.delta.removed_layers)
+        self.known_cache_keys = {
+            name: key for name, key in self.delta_manifest["layers"].items()
+            if key is not None and name not in touched
+        }
+
+        # validate all layers without fragments of the previous generation,
+        # including unchanged layers newly added to the project, which may
+        # not have been validated before
+        layers = [
+            layer for layer in layers
+            if not isinstance(layer, dict) or
+            layer.get("name") not in self.known_cache_keys
+        ]
+        self.logger.info(
+            "Delta: %d changed and %d removed layers, validating %d of %d "
+            "layers in project" % (
+                len(self.delta.changed_layers),
+                len(self.delta.removed_layers), len(layers),
+                len(self.project_layer_names)))
+
+        return layers_lookup, layers
+
+    def load_delta_manifest(self, is_wfs):
+        """Load manifest of the previous generation for delta mode.
+
+        :param bool is_wfs: Whether mode is WMS or WFS
+        return dict manifest : Manifest or None if not in delta mode or if
+               the full project has to be generated
+        """
+        if self.delta is None:
+            return None
+
+        if self.fragment_cache_dir is None:
+            self.logger.warning(
+                "Delta mode requires a fragment cache dir, "
+                "generating full project")
+            return None
+
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except Exception as e:
+            self.logger.warning(
+                "Could not load manifest %s, generating full project:\n%s" % (
+                    self.manifest_path, e))
+            return None
+
+        if manifest.get("mode") != ('wfs' if is_wfs else 'wms') or \
+                manifest.get("cache_salt") != self.fragment_cache_salt or \
+                not isinstance(manifest.get("layers"), dict):
+            self.logger.warning(
+                "Manifest %s does not match mode or QGS template, "
+                "generating full project" % self.manifest_path)
+            return None
+
+        if manifest.get("config_digest") != self.config_digest(
+                self.delta.base_config):
+            self.logger.warning(
+                "Manifest %s does not match the base config of the delta, "
+                "generating full project" % self.manifest_path)
+            return None
+
+        return manifest
+
+    def project_affected_by_delta(self, is_wfs):
+        """Check whether the project has to be regenerated for the delta.
+
+        :param bool is_wfs: Whether mode is WMS or WFS
+        return bool affected : Return true if the project is affected
+        """
+        if self.delta.changed_keys or (is_wfs and self.delta.reordered):
+            return True
+
+        if not os.path.exists(self.qgs_path()):
+            return True
+
+        # layers and productsets of the previous and the new project
+        names = set(self.delta_manifest["layers"])
+        names.update(self.project_layer_names)
+
+        touched = set(self.delta.changed_layers)
+        touched.update(self.delta.removed_layers)
+
+        return not touched.isdisjoint(names)
+
+    def validate_layers(self, layers, layers_lookup=None, schema=None):
+        """Validate config with only the given layers against its JSON schema.
+
+        :param list layers: Layer configs to validate
+        :param OrderedDict layers_lookup: Reachable layer configs by name
+                                          (WMS only)
+        :param dict schema: Already downloaded JSON schema
+        return bool valid : Return true if JSON config is valid
+        """
+        if layers is self.config.get("layers"):
+            config = self.config
+            layer_indices = None
+        else:
+            config = dict(self.config, layers=layers)
+            layer_indices = self.config_layer_indices(layers)
+
+        # download JSON schema first, to time only the validation
+        if schema is None:
+            schema = self.download_schema(config["$schema"])
+            if schema is None:
+                return False
+
+        start = self.logger.timestamp()
+        if self.validate_schema(config, layer_indices, schema) is False:
+            return False
+
+        if layers_lookup is not None and self.delta_manifest is None:
+            self.log_pruning_savings(
+                layers_lookup, self.logger.timestamp() - start)
+
+        return True
+
+    def config_layer_indices(self, layers):
+        """Return positions of layers in config for validation messages.
+
+        :param list layers: Layer configs from config
+        return list layer_indices : Positions in config
+        """
+        positions = {
+            id(layer): i for i, layer in enumerate(self.config["layers"])
+        }
+        return [positions[id(layer)] for layer in layers]
+
+    def collect_print_templates(self):
+        """Decode print templates and save their assets.
+
+        return list composers : Decoded print templates
+        """
+        composers = []
 
         # Iterate through all assets used in the QPT and save them
         # in the filesystem
         # If the asset path defines directories that do not exist,
         # then create those directories and save the asset image
         for composer in self.config.get("print_templates", []):
-            try:
-                composers.append(base64.b64decode(
-                    composer["template_base64"]).decode("utf-8"))
-
-            except:
-                self.logger.error(
-                    "Error trying to decode print template!")
+            template = self.decode_print_template(
+                composer["template_base64"],
+                composer.get("template_compression"))
+            if template is not None:
+                composers.append(template)
 
             for asset in composer.get("template_assets", []):
                 try:
@@ -559,11 +1587,9 @@ class Json2Qgs():
                         self.project_output_dir, asset["path"]
                     )
                     if self.path_is_child(self.project_output_dir, asset_path):
-                        os.makedirs(
-                            os.path.dirname(asset_path), exist_ok=True)
-                        with open(asset_path, "wb") as fh:
-                            fh.write(
-                                base64.b64decode(asset["base64"]))
+                        self.save_asset(
+                            asset_path, asset["base64"],
+                            asset.get("compression"))
                     else:
                         self.logger.warning(
                             "An error occured when trying to save {}\n"
@@ -575,90 +1601,308 @@ class Json2Qgs():
                         "An error occured when trying to save {}\n{}".format(
                             asset["path"], str(e)))
 
-        qgs_template = Template(qgis_template)
-        binding = self.collect_wms_metadata(self.config.get(
-            "wms_metadata", {}), layertree, composers=composers)
-        qgs = qgs_template.render(**binding)
+        return composers
+
+    def render_project(self, qgis_template, binding, stream):
+        """Render QGS template or write QGS directly to stream.
+
+        :param str qgis_template: QGS template
+        :param dict binding: Dict for jinja
+        :param TextIO stream: Output stream
+        """
+        if self.fragment_cache_dir is not None or self.workers > 1:
+            self.render_layer_fragments(qgis_template, binding)
+
+        if self.renderer == 'xml':
+            QgsWriter(stream).write_project(binding)
+        else:
+            stream.writelines(
+                Template(qgis_template).generate(**binding))
+
+    def write_project(self, qgis_template, binding, is_wfs):
+        """Render QGS file and verify it if enabled.
 
-        qgs_filename = "%s.qgs" % self.qgs_name
-        qgs_path = os.path.join(self.project_output_dir, qgs_filename)
+        The project is rendered directly to a temp file, which replaces
+        the QGS file once complete, unless the generation has been
+        cancelled in the meantime.
+
+        :param str qgis_template: QGS template
+        :param dict binding: Dict for jinja
+        :param bool is_wfs: Whether mode is WMS or WFS
+        return str qgs_path : Path of written QGS file or None on error
+        """
+        qgs_path = self.qgs_path()
+        tmp_path = "%s.tmp" % qgs_path
 
         try:
-            with open(qgs_path, 'w', encoding='utf-8') as f:
-                f.write(qgs)
-                self.logger.debug("Wrote %s" % os.path.abspath(qgs_path))
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                self.render_project(qgis_template, binding, f)
+            if self.cancelled:
+                self.logger.info(
+                    "Generation cancelled, not writing %s" % qgs_path)
+                return None
+            os.replace(tmp_path, qgs_path)
+            self.logger.debug("Wrote %s" % os.path.abspath(qgs_path))
         except PermissionError:
             self.logger.error(
                 "PermissionError: Could not write %s" % os.path.abspath(
                     qgs_path))
+            return None
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
-    def generate_wfs_project(self):
-        """Generate WFS project
+        if self.fragment_cache_dir is not None:
+            self.write_manifest(is_wfs)
+
+        if self.verify:
+            self.verify_project(qgs_path, is_wfs)
+
+        return qgs_path
+
+    def qgs_path(self):
+        """Return path of the generated QGS file."""
+        return os.path.join(self.project_output_dir, "%s.qgs" % self.qgs_name)
 
+    def write_manifest(self, is_wfs):
+        """Write manifest with the fragment cache keys of all layers in the
+        project, as base for regenerating it from a delta.
+
+        :param bool is_wfs: Whether mode is WMS or WFS
+        """
+        manifest = OrderedDict([
+            ("mode", 'wfs' if is_wfs else 'wms'),
+            ("cache_salt", self.fragment_cache_salt),
+            # base config for the next delta
+            ("config_digest", self.config_digest(self.config)),
+            # cache keys by layer name (None for productsets)
+            ("layers", OrderedDict(
+                (name, self.layer_cache_keys.get(name))
+                for name in self.project_layer_names
+            ))
+        ])
+        self.save_manifest(manifest)
+
+    def save_manifest(self, manifest):
+        """Save manifest of the generated project.
+
+        :param dict manifest: Manifest
         """
+        try:
+            # write to temp file and rename to avoid partial manifests
+            fd, tmp_path = tempfile.mkstemp(
+                dir=self.project_output_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_path, self.manifest_path)
+        except Exception as e:
+            self.logger.warning(
+                "Could not write manifest %s:\n%s" % (self.manifest_path, e))
 
-        if os.path.exists(self.project_output_dir) is False:
-            self.logger.error(
-                "Destination directory ({}) does not exist!".format(
-                    self.project_output_dir))
-            return
+    def collect_reachable_layers(self, layer_names, layers_lookup,
+                                 reachable=None):
+        """Recursively collect names of all layers and productsets
+        reachable from layer_names.
 
-        if self.validate_schema() is False:
-            return
+        NOTE: only used for WMS mode
 
-        qgis_template = self.load_template(self.qgs_template_fn)
+        :param list layer_names: Layer names to start from
+        :param dict layers_lookup: Lookup for layer configs by name
+        :param OrderedDict reachable: Reachable layer configs by name
+        return OrderedDict reachable : Reachable layer configs by name
+        """
+        if reachable is None:
+            reachable = OrderedDict()
+
+        for layer_name in layer_names:
+            layer = layers_lookup.get(layer_name)
+            if layer is None or layer_name in reachable:
+                continue
+
+            reachable[layer_name] = layer
+            if layer.get("type") == 'productset':
+                self.collect_reachable_layers(
+                    layer["sublayers"], layers_lookup, reachable)
+
+        return reachable
+
+    def prune_unreachable_layers(self):
+        """Collect lookup for layers reachable from the WMS top layers
+        and report all other layers as pruned.
+
+        NOTE: only used for WMS mode
+
+        return OrderedDict layers_lookup : Reachable layer configs by name
+        """
         layers = self.config.get("layers")
+        if not isinstance(layers, list):
+            # invalid config, will be reported by schema validation
+            return OrderedDict()
 
-        composers = []
-        layertree = []
+        reachable = self.reachable_layers()
+
+        self.pruned_layers = [
+            layer for layer in layers
+            if not isinstance(layer, dict) or
+            reachable.get(layer.get("name")) is not layer
+        ]
+        for layer in self.pruned_layers:
+            self.logger.debug(
+                "Pruned unreachable layer: '%s'" % (
+                    layer.get("name") if isinstance(layer, dict) else layer))
+
+        return reachable
+
+    def reachable_layers(self):
+        """Collect lookup for layers reachable from the WMS top layers.
+
+        NOTE: only used for WMS mode
 
+        return OrderedDict layers_lookup : Reachable layer configs by name
+        """
+        layers = self.config.get("layers")
+        if not isinstance(layers, list):
+            return OrderedDict()
+
+        # collect lookup for all layers by name
+        layers_lookup = {}
         for layer in layers:
-            self.logger.debug("Adding layer:'%s'" % layer["name"])
-            layertree.append(self.collect_single_layer(layer, False))
+            if isinstance(layer, dict):
+                layers_lookup[layer.get("name")] = layer
 
-        qgs_template = Template(qgis_template)
-        binding = self.collect_wfs_metadata(self.config.get(
-            "wfs_metadata", {}), layertree)
-        qgs = qgs_template.render(**binding)
+        return self.collect_reachable_layers(
+            self.wms_top_layers, layers_lookup)
 
-        qgs_filename = "%s.qgs" % self.qgs_name
-        qgs_path = os.path.join(self.project_output_dir, qgs_filename)
+    def log_pruning_savings(self, layers_lookup, validation_duration):
+        """Log number and payload size of pruned layers and the estimated
+        time saved for their schema validation.
 
-        try:
-            with open(qgs_path, 'w', encoding='utf-8') as f:
-                f.write(qgs)
-                self.logger.debug("Wrote %s" % os.path.abspath(qgs_path))
-        except PermissionError:
-            self.logger.error(
-                "PermissionError: Could not write %s" % os.path.abspath(
-                    qgs_path))
+        :param OrderedDict layers_lookup: Reachable layer configs by name
+        :param timedelta validation_duration: Duration of schema validation
+                                              of the reachable layers
+        """
+        if not self.pruned_layers:
+            return
 
-    def validate_schema(self):
-        """Validate config against its JSON schema.
+        pruned_size = sum(
+            self.layer_payload_size(layer) for layer in self.pruned_layers)
+        reachable_size = sum(
+            self.layer_payload_size(layer)
+            for layer in layers_lookup.values())
 
-        return bool valid : Return true if JSON config is valid
+        # extrapolate from validation of reachable layers
+        saved_ms = validation_duration.total_seconds() * 1000 * (
+            pruned_size / reachable_size if reachable_size else
+            len(self.pruned_layers) / max(1, len(layers_lookup)))
+
+        self.logger.info(
+            "Pruned %d of %d layers unreachable from wms_top_layers: "
+            "skipped %.1f kB of payload, saved ~%.0f ms of validation" % (
+                len(self.pruned_layers),
+                len(self.pruned_layers) + len(layers_lookup),
+                pruned_size / 1024, saved_ms))
+
+    def layer_payload_size(self, layer):
+        """Return size of base64 encoded QML and assets of a layer.
+
+        :param dict layer: Data layer dictionary
+        return int size : Payload size in bytes
         """
+        if not isinstance(layer, dict):
+            return 0
 
-        # download JSON schema
-        response = requests.get(self.config["$schema"])
+        size = len(layer.get("qml_base64") or "")
+        for asset in layer.get("qml_assets") or []:
+            size += len(asset.get("base64") or "")
+
+        return size
+
+    def verify_project(self, qgs_path, is_wfs):
+        """Verify structure of a generated QGS file against the config.
+
+        :param str qgs_path: Path to generated QGS file
+        :param bool is_wfs: Whether mode is WMS or WFS
+        return bool valid : Return true if QGS project is valid
+        """
+        start = self.logger.timestamp()
+
+        if is_wfs:
+            layers = self.config.get("layers", [])
+        else:
+            # unreachable layers are neither validated nor in the project
+            layers = self.reachable_layers().values()
+
+        layer_names = []
+        group_names = []
+        for layer in layers:
+            if layer.get("type") == 'productset':
+                group_names.append(layer["name"])
+            else:
+                layer_names.append(layer["name"])
+
+        asset_paths = []
+        if not is_wfs:
+            for composer in self.config.get("print_templates", []):
+                for asset in composer.get("template_assets", []):
+                    asset_paths.append(asset["path"])
+
+        errors = QgsVerifier(self.logger).verify(
+            qgs_path, layer_names, group_names, asset_paths, is_wfs)
+        for error in errors:
+            self.logger.error("Verification error: %s" % error)
+
+        duration = self.logger.timestamp() - start
+        self.logger.info(
+            "Verified %s in %.1f ms: %s" % (
+                os.path.abspath(qgs_path),
+                duration.total_seconds() * 1000,
+                "%d errors" % len(errors) if errors else "OK"))
+
+        return not errors
+
+    def download_schema(self, url):
+        """Download and parse JSON schema using the pooled HTTP session.
+
+        param str url: JSON schema URL
+        return dict schema : Parsed JSON schema or None on error
+        """
+        response = self.http_session.get(url)
         if response.status_code != requests.codes.ok:
             self.logger.error(
                 "Could not download JSON schema from %s:\n%s" %
-                (self.config["$schema"], response.text)
+                (url, response.text)
             )
-            return False
+            return None
 
         # parse JSON
         try:
-            schema = json.loads(response.text)
+            return json.loads(response.text)
         except Exception as e:
             self.logger.error("Could not parse JSON schema:\n%s" % e)
-            return False
+            return None
+
+    def validate_schema(self, config=None, layer_indices=None, schema=None):
+        """Validate config against its JSON schema.
+
+        param dict config: Config to validate (default: Json2Qgs config)
+        param list layer_indices: Original positions of the layers in config
+                                  if layers have been pruned
+        param dict schema: Already downloaded JSON schema
+        return bool valid : Return true if JSON config is valid
+        """
+        if config is None:
+            config = self.config
+
+        # download JSON schema
+        if schema is None:
+            schema = self.download_schema(config["$schema"])
+            if schema is None:
+                return False
 
         # validate against schema
         valid = True
         validator = jsonschema.validators.validator_for(schema)(schema)
-        for error in validator.iter_errors(self.config):
+        for error in validator.iter_errors(config):
             valid = False
 
             # collect error messages
@@ -671,8 +1915,13 @@ class Json2Qgs():
             # collect path to concerned subconfig
             # e.g. ['resources', 'wms_services', 0]
             #      => ".resources.wms_services[0]"
+            absolute_path = list(error.absolute_path)
+            if layer_indices is not None and len(absolute_path) > 1 and \
+                    absolute_path[0] == 'layers':
+                # map to position in unpruned layers
+                absolute_path[1] = layer_indices[absolute_path[1]]
             path = ""
-            for p in error.absolute_path:
+            for p in absolute_path:
                 if isinstance(p, int):
                     path += "[%d]" % p
                 else:
@@ -713,6 +1962,97 @@ class Json2Qgs():
         return valid
 
 
+@lru_cache(maxsize=4096)
+def parse_json_alias(alias):
+    """Return alias from a JSON alias config.
+
+    Results are cached for the most recent distinct alias strings, as the
+    same JSON aliases are used by many layers.
+
+    :param str alias: JSON alias config
+    return str alias : Alias or the JSON string if it has no alias
+    """
+    return json.loads(alias).get('alias', alias)
+
+
+# worker pool helpers for collecting layers
+collect_generator = None
+collect_is_wms = True
+
+
+def init_collect_worker(generator, is_wms):
+    """Keep generator for collecting layers once per worker.
+
+    :param Json2Qgs generator: Generator of the project
+    :param bool is_wms: Whether mode is WMS or WFS
+    """
+    global collect_generator, collect_is_wms
+    collect_generator = generator
+    collect_is_wms = is_wms
+
+
+def collect_layer(layer):
+    """Collect single layer info in a worker.
+
+    :param dict layer: Data layer dictionary
+    return dict qgs_layer : QGS layer, the layer ID is assigned by the caller
+    """
+    return collect_generator.collect_single_layer(layer, collect_is_wms)
+
+
+# worker pool helpers for rendering layer fragments
+fragment_macros = None
+
+
+def init_fragment_worker(qgis_template, binding, renderer):
+    """Compile QGS template and evaluate its layer macros once per worker.
+
+    :param str qgis_template: QGS template with layer macros
+    :param dict binding: Dict for jinja without layers
+    :param str renderer: Backend for writing QGS files: [jinja | xml]
+    """
+    global fragment_macros
+    fragment_macros = fragment_renderer(qgis_template, binding, renderer)
+
+
+def fragment_renderer(qgis_template, binding, renderer):
+    """Return layer macros of the QGS template, or the XML writer
+    equivalent.
+
+    :param str qgis_template: QGS template with layer macros
+    :param dict binding: Dict for jinja without layers
+    :param str renderer: Backend for writing QGS files: [jinja | xml]
+    """
+    if renderer == 'xml':
+        return QgsFragments()
+
+    return Template(qgis_template).make_module(binding)
+
+
+def render_fragments(layers):
+    """Render fragments of a chunk of layers in a worker.
+
+    :param list layers: QGS layers
+    return list fragments : Rendered fragments of the layers
+    """
+    return [layer_fragments(fragment_macros, layer) for layer in layers]
+
+
+def layer_fragments(macros, layer):
+    """Render layer tree, legend and maplayer fragments of a layer.
+
+    :param TemplateModule macros: Evaluated QGS template with layer macros
+                                  or QgsFragments
+    :param dict layer: QGS layer
+    return dict fragments : Rendered fragments by name
+    """
+    return {
+        "layer_tree": str(macros.layer_tree_layer(layer)),
+        "legend": str(macros.legend_layer(layer)),
+        "maplayer": str(macros.maplayer(layer))
+    }
+
+
 # command line interface
 if __name__ == '__main__':
     print("Starting SO!GIS json2qgs...")
@@ -748,6 +2088,36 @@ if __name__ == '__main__':
         "--log_level", choices=['info', 'debug'], default="info", nargs='?',
         help="Specifies the log level (default: info)"
     )
+    parser.add_argument(
+        '--verify', action='store_true',
+        help="Verify the structure of the generated QGS file"
+    )
+    parser.add_argument(
+        '--workers', type=int, default=1, nargs='?',
+        help="Number of worker processes for collecting and rendering layers "
+             "(default: 1)"
+    )
+    parser.add_argument(
+        '--cacheDir',
+        help="Directory for caching rendered layer fragments between runs",
+        default=None, nargs='?'
+    )
+    parser.add_argument(
+        '--delta',
+        help="Path to JSON Patch or changed layers delta against qgsContent, "
+             "to regenerate only affected layers (requires --cacheDir)",
+        default=None, nargs='?'
+    )
+    parser.add_argument(
+        '--wfsFast', action='store_true',
+        help="Write minimal styles with only the attribute aliases "
+             "for WFS projects"
+    )
+    parser.add_argument(
+        '--renderer', choices=['jinja', 'xml'], default='jinja', nargs='?',
+        help="Backend for writing the QGS file, xml is only available for "
+             "QGIS 3 (default: jinja)"
+    )
     args = parser.parse_args()
 
     # read Json2Qgs config file
@@ -759,6 +2129,18 @@ if __name__ == '__main__':
         print("Error loading qgsContent JSON:\n%s" % e)
         exit(1)
 
+    # apply delta to config in memory
+    delta = None
+    if args.delta:
+        try:
+            with open(args.delta) as f:
+                delta = QgsContentDelta(
+                    json.load(f, object_pairs_hook=OrderedDict))
+            config = delta.apply(config)
+        except Exception as e:
+            print("Error applying delta:\n%s" % e)
+            exit(1)
+
     if args.log_level == "debug":
         log_level = logging.DEBUG
     else:
@@ -770,7 +2152,9 @@ if __name__ == '__main__':
     # create Json2Qgs
     generator = Json2Qgs(
         config, logger, args.destination,
-        args.qgisVersion, args.qgsTemplateDir, args.qgsName)
+        args.qgisVersion, args.qgsTemplateDir, args.qgsName,
+        verify=args.verify, cache_dir=args.cacheDir, workers=args.workers,
+        delta=delta, wfs_fast=args.wfsFast, renderer=args.renderer)
     if not generator.can_generate:
         print(
             "Error: Generator stopped! Please check if all"
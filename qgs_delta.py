@@ -0,0 +1,271 @@
+import copy
+
+
+class QgsContentDelta():
+    """QgsContentDelta class
+
+    Apply a delta document to a qgsContent config in memory and keep track
+    of the changed layers.
+
+    The delta is either a JSON Patch (RFC 6902) as list of operations, or a
+    changed layers delta:
+
+        {
+          "layers": [<added or changed layer configs>],
+          "removed_layers": [<layer names>],
+          <other top-level keys to replace>
+        }
+
+    Only the modified parts of the config are copied, all other layers are
+    shared with the base config. Changed layers are therefore detected by
+    identity, without comparing the full catalog.
+    """
+
+    def __init__(self, delta):
+        """Constructor
+
+        :param obj delta: JSON Patch or changed layers delta
+        """
+        if not isinstance(delta, (list, dict)):
+            raise ValueError(
+                "Delta must be a JSON Patch or a changed layers delta")
+
+        self.delta = delta
+
+        # names of added or changed layers
+        self.changed_layers = []
+        # names of removed layers
+        self.removed_layers = []
+        # changed top-level keys except layers
+        self.changed_keys = []
+        # whether the order of unchanged layers has changed
+        self.reordered = False
+        # base config the delta has been applied to
+        self.base_config = None
+
+    def apply(self, config):
+        """Apply delta to config and collect the changes.
+
+        :param dict config: Base qgsContent config
+        return dict config : Patched config
+        """
+        if isinstance(self.delta, list):
+            patched = self.apply_json_patch(config)
+        else:
+            patched = self.apply_layers_delta(config)
+
+        self.collect_changes(config, patched)
+        self.base_config = config
+
+        return patched
+
+    def apply_layers_delta(self, config):
+        """Apply changed layers delta to config.
+
+        :param dict config: Base qgsContent config
+        return dict config : Patched config
+        """
+        patched = copy.copy(config)
+        layers = list(config.get("layers", []))
+
+        positions = {}
+        for i, layer in enumerate(layers):
+            positions[layer.get("name")] = i
+
+        for layer in self.delta.get("layers", []):
+            if layer.get("name") in positions:
+                layers[positions[layer.get("name")]] = layer
+            else:
+                positions[layer.get("name")] = len(layers)
+                layers.append(layer)
+
+        removed = set(self.delta.get("removed_layers", []))
+        patched["layers"] = [
+            layer for layer in layers if layer.get("name") not in removed
+        ]
+
+        for key, value in self.delta.items():
+            if key not in ["layers", "removed_layers"]:
+                patched[key] = value
+
+        return patched
+
+    def apply_json_patch(self, config):
+        """Apply JSON Patch operations to config.
+
+        :param dict config: Base qgsContent config
+        return dict config : Patched config
+        """
+        # containers already copied for the patched config by id
+        self.copied = {}
+        root = {"": self.writable(config)}
+
+        for operation in self.delta:
+            op = operation.get("op")
+            path = self.parse_pointer(operation.get("path"))
+            # prepend key of root wrapper
+            path = [""] + path
+
+            if op == 'add':
+                self.add(root, path, operation["value"])
+            elif op == 'remove':
+                self.remove(root, path)
+            elif op == 'replace':
+                self.remove(root, path)
+                self.add(root, path, operation["value"])
+            elif op == 'move':
+                from_path = [""] + self.parse_pointer(operation.get("from"))
+                value = self.get(root, from_path)
+                self.remove(root, from_path)
+                self.add(root, path, value)
+            elif op == 'copy':
+                from_path = [""] + self.parse_pointer(operation.get("from"))
+                self.add(
+                    root, path, copy.deepcopy(self.get(root, from_path)))
+            elif op == 'test':
+                if self.get(root, path) != operation.get("value"):
+                    raise ValueError(
+                        "JSON Patch test failed at '%s'" % operation["path"])
+            else:
+                raise ValueError("Unsupported JSON Patch operation '%s'" % op)
+
+        del self.copied
+        return root[""]
+
+    def collect_changes(self, config, patched):
+        """Collect changed layers and keys by comparing object identities.
+
+        :param dict config: Base qgsContent config
+        :param dict patched: Patched config
+        """
+        base_layers = config.get("layers", [])
+        patched_layers = patched.get("layers", [])
+
+        base_ids = set(id(layer) for layer in base_layers)
+        patched_ids = set(id(layer) for layer in patched_layers)
+
+        self.changed_layers = [
+            layer.get("name") for layer in patched_layers
+            if id(layer) not in base_ids
+        ]
+        self.removed_layers = [
+            layer.get("name") for layer in base_layers
+            if id(layer) not in patched_ids and
+            layer.get("name") not in self.changed_layers
+        ]
+        self.reordered = [
+            id(layer) for layer in base_layers if id(layer) in patched_ids
+        ] != [
+            id(layer) for layer in patched_layers if id(layer) in base_ids
+        ]
+        self.changed_keys = [
+            key for key in list(config.keys()) + [
+                key for key in patched.keys() if key not in config
+            ]
+            if key != "layers" and config.get(key) is not patched.get(key)
+        ]
+
+    def parse_pointer(self, pointer):
+        """Split JSON Pointer into unescaped reference tokens.
+
+        :param str pointer: JSON Pointer, e.g. '/layers/0/title'
+        return list tokens : Reference tokens
+        """
+        if not isinstance(pointer, str) or (
+                pointer and not pointer.startswith('/')):
+            raise ValueError("Invalid JSON Pointer '%s'" % pointer)
+        if pointer == "":
+            return []
+
+        return [
+            token.replace('~1', '/').replace('~0', '~')
+            for token in pointer[1:].split('/')
+        ]
+
+    def writable(self, container):
+        """Return copy of container for the patched config, which may be
+        modified.
+
+        :param obj container: Dict or list of the base config
+        return obj container : Copied container
+        """
+        if id(container) in self.copied:
+            return container
+
+        container = copy.copy(container)
+        self.copied[id(container)] = container
+        return container
+
+    def child_key(self, container, token, append=False):
+        """Return key or index of token in container.
+
+        :param obj container: Dict or list
+        :param str token: Reference token
+        :param bool append: Whether '-' and the list length are valid
+        """
+        if isinstance(container, list):
+            if append and token == '-':
+                return len(container)
+            if not token.isdigit():
+                raise ValueError("Invalid list index '%s'" % token)
+            index = int(token)
+            if index > len(container) or (
+                    index == len(container) and not append):
+                raise ValueError("List index '%s' out of range" % token)
+            return index
+        elif isinstance(container, dict):
+            if not append and token not in container:
+                raise ValueError("Missing key '%s'" % token)
+            return token
+
+        raise ValueError("Cannot resolve '%s' in a value" % token)
+
+    def parent(self, root, path):
+        """Return writable parent container of path.
+
+        :param dict root: Root wrapper of patched config
+        :param list path: Reference tokens
+        """
+        container = root
+        for token in path[:-1]:
+            key = self.child_key(container, token)
+            child = self.writable(container[key])
+            container[key] = child
+            container = child
+
+        return container
+
+    def get(self, root, path):
+        """Return value at path without copying.
+
+        :param dict root: Root wrapper of patched config
+        :param list path: Reference tokens
+        """
+        value = root
+        for token in path:
+            value = value[self.child_key(value, token)]
+
+        return value
+
+    def add(self, root, path, value):
+        """Add value at path.
+
+        :param dict root: Root wrapper of patched config
+        :param list path: Reference tokens
+        :param obj value: Value to add
+        """
+        container = self.parent(root, path)
+        key = self.child_key(container, path[-1], True)
+        if isinstance(container, list):
+            container.insert(key, value)
+        else:
+            container[key] = value
+
+    def remove(self, root, path):
+        """Remove value at path.
+
+        :param dict root: Root wrapper of patched config
+        :param list path: Reference tokens
+        """
+        container = self.parent(root, path)
+        del container[self.child_key(container, path[-1])]
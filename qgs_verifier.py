@@ -0,0 +1,175 @@
+from collections import Counter
+from xml.etree.ElementTree import iterparse, ParseError
+
+import os
+
+
+class QgsVerifier():
+    """QgsVerifier class
+
+    Fast offline structural check of a generated QGS project.
+
+    The project is stream-parsed with iterparse and elements are cleared as
+    soon as they have been inspected, so memory stays flat and large projects
+    are checked without a running QGIS Server. The run time is linear in
+    the size of the project.
+
+    Only asset references which have been rewritten to the layer asset dir
+    (<layer name>/<asset path>) are checked. References to assets which
+    are not shipped in the qml_assets of a layer are not detected.
+    """
+
+    # element attributes which may reference assets in QML styles
+    ASSET_ATTRIBUTES = ['v', 'value']
+
+    def __init__(self, logger):
+        """Constructor
+
+        :param Logger logger: Logger
+        """
+        self.logger = logger
+
+    def verify(self, qgs_path, layer_names, group_names=[], asset_paths=[],
+               wfs_mode=False):
+        """Verify structure of a generated QGS project.
+
+        Checks that layer tree, legend and maplayer IDs are consistent, that
+        all expected layers and groups are present and that referenced assets
+        exist on disk.
+
+        :param str qgs_path: Path to generated QGS file
+        :param list layer_names: Names of expected single layers
+        :param list group_names: Names of expected layer groups
+        :param list asset_paths: Additional asset paths relative to the
+                                 project dir which must exist
+        :param bool wfs_mode: Whether all layers must be published as WFS
+        return list errors : List of problems found (empty if valid)
+        """
+        errors = []
+
+        project_dir = os.path.dirname(os.path.abspath(qgs_path))
+
+        # maplayer IDs with layer names
+        maplayers = {}
+        # layer tree layer IDs with layer names
+        tree_layers = {}
+        tree_groups = set()
+        legend_layer_ids = []
+        wfs_layer_ids = []
+        # referenced assets as (<layer name>, <relative path>)
+        asset_refs = []
+
+        # stack of open element tags
+        path = []
+        # state of current <maplayer>
+        maplayer = None
+
+        try:
+            for event, elem in iterparse(qgs_path, events=('start', 'end')):
+                if event == 'start':
+                    path.append(elem.tag)
+                    if elem.tag == 'maplayer':
+                        maplayer = {'id': None, 'name': None, 'values': []}
+                    elif maplayer is not None:
+                        for key in self.ASSET_ATTRIBUTES:
+                            value = elem.get(key)
+                            if value and '/' in value:
+                                maplayer['values'].append(value)
+                    continue
+
+                path.pop()
+                tag = elem.tag
+                parent = path[-1] if path else None
+
+                if tag == 'maplayer' and maplayer is not None:
+                    layer_id = maplayer['id']
+                    if layer_id is None:
+                        errors.append(
+                            "Map layer '%s' has no ID" % maplayer['name'])
+                    elif layer_id in maplayers:
+                        errors.append("Duplicate map layer ID '%s'" % layer_id)
+                    else:
+                        maplayers[layer_id] = maplayer['name']
+
+                    # assets are saved under <layer name>/<asset path>
+                    prefix = "%s/" % maplayer['name']
+                    for value in maplayer['values']:
+                        if value.startswith(prefix):
+                            asset_refs.append((maplayer['name'], value))
+                    maplayer = None
+                elif maplayer is not None and parent == 'maplayer':
+                    if tag == 'id':
+                        maplayer['id'] = elem.text
+                    elif tag == 'layername':
+                        maplayer['name'] = elem.text
+                elif tag == 'layer-tree-layer':
+                    layer_id = elem.get('id')
+                    if layer_id in tree_layers:
+                        errors.append(
+                            "Duplicate layer tree ID '%s'" % layer_id)
+                    tree_layers[layer_id] = elem.get('name')
+                elif tag == 'layer-tree-group' and parent == 'layer-tree-group':
+                    tree_groups.add(elem.get('name'))
+                elif tag == 'legendlayerfile':
+                    legend_layer_ids.append(elem.get('layerid'))
+                elif tag == 'value' and parent == 'WFSLayers':
+                    wfs_layer_ids.append(elem.text)
+
+                if maplayer is None:
+                    # discard inspected content
+                    elem.clear()
+        except (ParseError, OSError) as e:
+            errors.append("Could not parse %s:\n%s" % (qgs_path, e))
+            return errors
+
+        # compare IDs of layer tree, legend and map layers
+        for layer_id, name in tree_layers.items():
+            if layer_id not in maplayers:
+                errors.append(
+                    "Layer tree entry '%s' references missing map layer "
+                    "ID '%s'" % (name, layer_id))
+            elif maplayers[layer_id] != name:
+                errors.append(
+                    "Layer tree entry '%s' does not match map layer name "
+                    "'%s' of ID '%s'" % (name, maplayers[layer_id], layer_id))
+        for layer_id in legend_layer_ids:
+            if layer_id not in maplayers:
+                errors.append(
+                    "Legend entry references missing map layer ID '%s'" %
+                    layer_id)
+        legend_counts = Counter(legend_layer_ids)
+        wfs_layer_id_set = set(wfs_layer_ids)
+        for layer_id, name in maplayers.items():
+            if layer_id not in tree_layers:
+                errors.append("Map layer '%s' is not in layer tree" % name)
+            if legend_counts[layer_id] != 1:
+                errors.append(
+                    "Map layer '%s' has %d legend entries" % (
+                        name, legend_counts[layer_id]))
+            if wfs_mode and layer_id not in wfs_layer_id_set:
+                errors.append("Map layer '%s' is not published as WFS" % name)
+        for layer_id in wfs_layer_ids:
+            if layer_id not in maplayers:
+                errors.append(
+                    "WFS layer list references missing map layer ID '%s'" %
+                    layer_id)
+
+        # check configured layers and groups
+        maplayer_names = set(maplayers.values())
+        for name in layer_names:
+            if name not in maplayer_names:
+                errors.append("Configured layer '%s' is missing" % name)
+        for name in group_names:
+            if name not in tree_groups:
+                errors.append("Configured group '%s' is missing" % name)
+
+        # check assets on disk
+        for layer_name, rel_path in asset_refs:
+            if not os.path.isfile(os.path.join(project_dir, rel_path)):
+                errors.append(
+                    "[Layer: %s] Missing asset %s" % (layer_name, rel_path))
+        for rel_path in asset_paths:
+            if not os.path.isfile(os.path.join(project_dir, rel_path)):
+                errors.append("Missing asset %s" % rel_path)
+
+        return errors
@@ -0,0 +1,583 @@
+from io import StringIO
+
+
+# spatial reference system of all layers and the project
+SPATIALREFSYS = (
+    "<spatialrefsys>"
+    "<proj4>+proj=somerc +lat_0=46.95240555555556 +lon_0=7.439583333333333 "
+    "+k_0=1 +x_0=2600000 +y_0=1200000 +ellps=bessel "
+    "+towgs84=674.374,15.056,405.346,0,0,0,0 +units=m +no_defs</proj4>"
+    "<srsid>47</srsid>"
+    "<srid>2056</srid>"
+    "<authid>EPSG:2056</authid>"
+    "<description>CH1903+ / LV95</description>"
+    "<projectionacronym>somerc</projectionacronym>"
+    "<ellipsoidacronym>bessel</ellipsoidacronym>"
+    "<geographicflag>false</geographicflag>"
+    "</spatialrefsys>"
+)
+
+# static project parts between layer tree and legend
+MAPCANVAS = (
+    '<snapping-settings tolerance="12" unit="1" intersection-snapping="0" '
+    'mode="2" enabled="0" type="1"><individual-layer-settings/>'
+    '</snapping-settings>'
+    '<relations/>'
+    '<mapcanvas name="theMapCanvas" annotationsVisible="1">'
+    '<units>meters</units>'
+    '<extent>'
+    '<xmin>2590983.47500000009313226</xmin>'
+    '<ymin>1212806.11562500009313226</ymin>'
+    '<xmax>2646267.02499999990686774</xmax>'
+    '<ymax>1262755.00937499990686774</ymax>'
+    '</extent>'
+    '<rotation>0</rotation>'
+    '<destinationsrs>' + SPATIALREFSYS + '</destinationsrs>'
+    '<rendermaptile>0</rendermaptile>'
+    '</mapcanvas>'
+    '<projectModels/>'
+)
+
+# static project properties before the GUI settings
+PROPERTIES_LEGEND = (
+    '<Legend><filterByMap type="bool">false</filterByMap></Legend>'
+)
+
+# static project properties between GUI settings and WMS metadata
+PROPERTIES_DEFAULTS = (
+    '<Paths><Absolute type="bool">false</Absolute></Paths>'
+    '<PositionPrecision>'
+    '<DecimalPlaces type="int">2</DecimalPlaces>'
+    '<Automatic type="bool">true</Automatic>'
+    '<DegreeFormat type="QString">MU</DegreeFormat>'
+    '</PositionPrecision>'
+    '<Measure><Ellipsoid type="QString">bessel</Ellipsoid></Measure>'
+    '<Macros><pythonCode type="QString"></pythonCode></Macros>'
+    '<DefaultStyles>'
+    '<ColorRamp type="QString"></ColorRamp>'
+    '<Opacity type="double">1</Opacity>'
+    '<Marker type="QString"></Marker>'
+    '<Line type="QString"></Line>'
+    '<RandomColors type="bool">true</RandomColors>'
+    '<Fill type="QString"></Fill>'
+    '</DefaultStyles>'
+    '<PAL>'
+    '<SearchMethod type="int">0</SearchMethod>'
+    '<CandidatesLine type="int">50</CandidatesLine>'
+    '<ShowingPartialsLabels type="bool">true</ShowingPartialsLabels>'
+    '<ShowingCandidates type="bool">false</ShowingCandidates>'
+    '<CandidatesPolygon type="int">30</CandidatesPolygon>'
+    '<DrawRectOnly type="bool">false</DrawRectOnly>'
+    '<ShowingAllLabels type="bool">false</ShowingAllLabels>'
+    '<CandidatesPoint type="int">16</CandidatesPoint>'
+    '<TextFormat type="int">0</TextFormat>'
+    '</PAL>'
+    '<SpatialRefSys>'
+    '<ProjectionsEnabled type="int">1</ProjectionsEnabled>'
+    '</SpatialRefSys>'
+    '<Measurement>'
+    '<DistanceUnits type="QString">meters</DistanceUnits>'
+    '<AreaUnits type="QString">m2</AreaUnits>'
+    '</Measurement>'
+)
+
+# static WMS properties between WMS metadata and WFS properties
+PROPERTIES_WMS = (
+    '<WMSFeatureInfoAliasLayers><value><text/></value>'
+    '</WMSFeatureInfoAliasLayers>'
+    '<WMSFeatureInfoLayerAliases><value><text/></value>'
+    '</WMSFeatureInfoLayerAliases>'
+    '<WMSAddWktGeometry type="bool">true</WMSAddWktGeometry>'
+    '<WMSImageQuality type="int">90</WMSImageQuality>'
+    '<WMSPrecision type="QString">4</WMSPrecision>'
+    '<WMSRequestDefinedDataSources type="bool">false'
+    '</WMSRequestDefinedDataSources>'
+    '<WMSSegmentizeFeatureInfoGeometry type="bool">false'
+    '</WMSSegmentizeFeatureInfoGeometry>'
+    '<WMSServiceCapabilities type="bool">true</WMSServiceCapabilities>'
+    '<WMSUrl type="QString"></WMSUrl>'
+    '<WMSUseLayerIDs type="bool">false</WMSUseLayerIDs>'
+)
+
+# static project properties after the WFS properties
+PROPERTIES_WMTS = (
+    '<WMTSUrl type="QString"></WMTSUrl>' + "".join([
+        '<%s><Project type="bool">false</Project><Layer type="QStringList"/>'
+        '<Group type="QStringList"/></%s>' % (tag, tag)
+        for tag in ['WMTSLayers', 'WMTSJpegLayers', 'WMTSPngLayers']
+    ]) +
+    '<WMTSMinScale type="int">5000</WMTSMinScale>'
+    '<WFSTLayers>'
+    '<Delete type="QStringList"/>'
+    '<Update type="QStringList"/>'
+    '<Insert type="QStringList"/>'
+    '</WFSTLayers>'
+    '<WCSUrl type="QString"></WCSUrl>'
+    '<WCSLayers type="QStringList"/>'
+)
+
+# static project parts between properties and print layouts
+PROJECT_METADATA = (
+    '<visibility-presets/>'
+    '<transformContext/>'
+    '<projectMetadata>'
+    '<identifier></identifier>'
+    '<parentidentifier></parentidentifier>'
+    '<language></language>'
+    '<type></type>'
+    '<title></title>'
+    '<abstract></abstract>'
+    '<contact>'
+    '<name></name>'
+    '<organization></organization>'
+    '<position></position>'
+    '<voice></voice>'
+    '<fax></fax>'
+    '<email></email>'
+    '<role></role>'
+    '</contact>'
+    '<links/>'
+    '<author>AGDI</author>'
+    '<creation></creation>'
+    '</projectMetadata>'
+    '<Annotations/>'
+)
+
+
+# keys of binding values, which are already escaped for the jinja templates
+ESCAPED_BINDING_KEYS = [
+    'wms_service_title', 'wms_service_abstract', 'wms_url',
+    'wms_contact_person', 'wms_contact_organization', 'wms_contact_position',
+    'wms_contact_phone', 'wms_contact_mail', 'wms_fees',
+    'wms_access_constraints', 'wms_root_name', 'wms_root_title', 'wfs_url'
+]
+
+
+class Escaped(str):
+    """Escaped class
+
+    Text value, which is already escaped with html.escape() and written
+    unchanged by XmlWriter.
+    """
+
+
+class XmlWriter():
+    """XmlWriter class
+
+    Incremental XML writer, which writes elements directly to a text stream.
+
+    All text and attribute values are escaped here, except Escaped values.
+    Pre-rendered XML, like QML styles, print templates or cached layer
+    fragments, is written unchanged with raw().
+    """
+
+    def __init__(self, stream):
+        """Constructor
+
+        :param TextIO stream: Output stream
+        """
+        self.write = stream.write
+        # tags of open elements
+        self.open_tags = []
+
+    def escape(self, value):
+        """Escape text value.
+
+        :param obj value: Value
+        """
+        if isinstance(value, Escaped):
+            return value
+        return str(value).replace('&', '&amp;').replace('<', '&lt;') \
+            .replace('>', '&gt;')
+
+    def quote(self, value):
+        """Escape and quote attribute value.
+
+        :param obj value: Value
+        """
+        if isinstance(value, Escaped):
+            return '"%s"' % value
+        return '"%s"' % self.escape(value).replace('"', '&quot;') \
+            .replace('\n', '&#10;').replace('\r', '&#13;') \
+            .replace('\t', '&#9;')
+
+    def tag(self, tag, attrs, raw_attrs=None):
+        """Return tag name with escaped attributes.
+
+        :param str tag: Tag name
+        :param dict attrs: Attribute values by name
+        :param str raw_attrs: Pre-rendered attributes
+        """
+        if attrs:
+            tag += "".join([
+                " %s=%s" % (name, self.quote(value))
+                for name, value in attrs.items()
+            ])
+        if raw_attrs:
+            tag += " %s" % raw_attrs
+
+        return tag
+
+    def start(self, tag, attrs=None, raw_attrs=None):
+        """Write start tag.
+
+        :param str tag: Tag name
+        :param dict attrs: Attribute values by name
+        :param str raw_attrs: Pre-rendered attributes
+        """
+        self.write("<%s>" % self.tag(tag, attrs, raw_attrs))
+        self.open_tags.append(tag)
+
+    def end(self):
+        """Write end tag of current element."""
+        self.write("</%s>\n" % self.open_tags.pop())
+
+    def element(self, tag, text=None, attrs=None):
+        """Write element with text content, or empty element if text is None.
+
+        :param str tag: Tag name
+        :param obj text: Text content
+        :param dict attrs: Attribute values by name
+        """
+        if text is None:
+            self.write("<%s/>\n" % self.tag(tag, attrs))
+        else:
+            self.write("<%s>%s</%s>\n" % (
+                self.tag(tag, attrs), self.escape(text), tag))
+
+    def raw(self, xml):
+        """Write pre-rendered XML unchanged.
+
+        :param str xml: XML
+        """
+        self.write(xml)
+        self.write("\n")
+
+
+class QgsWriter():
+    """QgsWriter class
+
+    Write a QGIS 3 project equivalent to the service_3.qgs template directly
+    to a stream.
+
+    The binding is the same as for the template, i.e. layer names and titles,
+    WMS datasources and the service metadata are already escaped, while all
+    other values are escaped by the writer.
+    """
+
+    def __init__(self, stream):
+        """Constructor
+
+        :param TextIO stream: Output stream
+        """
+        self.xml = XmlWriter(stream)
+
+    def write_project(self, binding):
+        """Write QGS project.
+
+        :param dict binding: Dict for jinja
+        """
+        xml = self.xml
+        binding = self.escaped_binding(binding)
+        layertree = binding.get('layertree', [])
+
+        xml.raw("<!DOCTYPE qgis PUBLIC 'http://mrcc.com/qgis.dtd' 'SYSTEM'>")
+        xml.start('qgis', {
+            'version': "3.4.4-Madeira",
+            'projectname': binding.get('wms_root_title', '')
+        })
+        xml.element('homePath', attrs={'path': ""})
+        xml.element('title', binding.get('wms_root_title', ''))
+        xml.element('autotransaction', attrs={'active': "0"})
+        xml.element('evaluateDefaultValues', attrs={'active': "0"})
+        xml.element('trust', attrs={'active': "0"})
+        xml.raw("<projectCrs>%s</projectCrs>" % SPATIALREFSYS)
+
+        xml.start('layer-tree-group')
+        self.write_layer_tree(layertree)
+        xml.element('customproperties')
+        xml.element('custom-order', attrs={'enabled': "0"})
+        xml.end()
+
+        xml.raw(MAPCANVAS)
+
+        xml.start('legend', {'updateDrawingOrder': "true"})
+        self.write_legend(layertree)
+        xml.end()
+
+        xml.element('mapViewDocks')
+
+        xml.start('projectlayers')
+        self.write_maplayers(layertree)
+        xml.end()
+
+        xml.element('layerorder')
+
+        self.write_properties(binding)
+
+        xml.raw(PROJECT_METADATA)
+
+        xml.start('Layouts')
+        for composer in binding.get('composers', []):
+            xml.raw(composer)
+        xml.end()
+
+        xml.end()
+
+    def escaped_binding(self, binding):
+        """Return binding with pre-escaped metadata values marked as Escaped.
+
+        :param dict binding: Dict for jinja
+        """
+        binding = dict(binding)
+        for key in ESCAPED_BINDING_KEYS:
+            if key in binding:
+                binding[key] = Escaped(binding[key])
+
+        return binding
+
+    def escaped_layer(self, item):
+        """Return QGS layer with pre-escaped values marked as Escaped.
+
+        :param dict item: QGS layer
+        """
+        item = dict(item)
+        item['name'] = Escaped(item['name'])
+        item['title'] = Escaped(item['title'])
+        if item.get('provider') == 'wms':
+            item['datasource'] = Escaped(item.get('datasource', ''))
+
+        return item
+
+    def write_layer_tree(self, items):
+        """Recursively write layer tree groups and layers.
+
+        :param list items: QGS layer tree
+        """
+        xml = self.xml
+        for item in items:
+            if item['type'] == 'productset':
+                xml.start('layer-tree-group', {
+                    'expanded': "1",
+                    'checked': "Qt::Checked",
+                    'name': item['name']
+                })
+                xml.start('customproperties')
+                xml.element('property', attrs={
+                    'key': "wmsAbstract", 'value': ""})
+                xml.element('property', attrs={
+                    'key': "wmsShortName", 'value': item['name']})
+                xml.element('property', attrs={
+                    'key': "wmsTitle", 'value': item['title']})
+                xml.end()
+                self.write_layer_tree(item['items'])
+                xml.end()
+            elif item['type']:
+                if item.get('fragments'):
+                    xml.raw(item['fragments']['layer_tree'])
+                else:
+                    self.write_layer_tree_layer(item)
+
+    def write_layer_tree_layer(self, item):
+        """Write layer tree entry of a single layer.
+
+        :param dict item: QGS layer
+        """
+        item = self.escaped_layer(item)
+        self.xml.start('layer-tree-layer', {
+            'expanded': "1",
+            'checked': "Qt::Checked",
+            'id': item['id'],
+            'name': item['name']
+        })
+        self.xml.end()
+
+    def write_legend(self, items):
+        """Recursively write legend groups and layers.
+
+        :param list items: QGS layer tree
+        """
+        xml = self.xml
+        for item in items:
+            if item['type'] == 'productset':
+                xml.start('legendgroup', {
+                    'open': "true",
+                    'checked': "Qt::Checked",
+                    'name': item['name']
+                })
+                self.write_legend(item['items'])
+                xml.end()
+            elif item['type']:
+                if item.get('fragments'):
+                    xml.raw(item['fragments']['legend'])
+                else:
+                    self.write_legend_layer(item)
+
+    def write_legend_layer(self, item):
+        """Write legend entry of a single layer.
+
+        :param dict item: QGS layer
+        """
+        xml = self.xml
+        item = self.escaped_layer(item)
+        xml.start('legendlayer', {
+            'drawingOrder': "-1",
+            'open': "true",
+            'checked': "Qt::Checked",
+            'name': item['name'],
+            'showFeatureCount': "0"
+        })
+        xml.start('filegroup', {'open': "true", 'hidden': "false"})
+        xml.element('legendlayerfile', attrs={
+            'isInOverview': "0",
+            'layerid': item['id'],
+            'visible': "1"
+        })
+        xml.end()
+        xml.end()
+
+    def write_maplayers(self, items):
+        """Recursively write map layers.
+
+        :param list items: QGS layer tree
+        """
+        for item in items:
+            if item['type'] == 'productset':
+                self.write_maplayers(item['items'])
+            elif item['type']:
+                if item.get('fragments'):
+                    self.xml.raw(item['fragments']['maplayer'])
+                else:
+                    self.write_maplayer(item)
+
+    def write_maplayer(self, item):
+        """Write map layer of a single layer.
+
+        :param dict item: QGS layer
+        """
+        xml = self.xml
+        item = self.escaped_layer(item)
+        xml.start(
+            'maplayer', {'type': item.get('layertype', '')},
+            item.get('attributes'))
+        if item.get('extent') is not None:
+            xml.start('extent')
+            for tag, value in zip(
+                    ['xmin', 'ymin', 'xmax', 'ymax'], item['extent']):
+                xml.element(tag, value)
+            xml.end()
+        xml.element('id', item['id'])
+        xml.element('datasource', item.get('datasource', ''))
+        xml.element('layername', item['name'])
+        xml.element('shortname', item['name'])
+        xml.element('title', item['title'])
+        xml.element('abstract', item.get('abstract', ''))
+        xml.raw("<srs>%s</srs>" % SPATIALREFSYS)
+        xml.element(
+            'provider', item.get('provider', ''), {'encoding': "UTF-8"})
+        if item.get('style'):
+            xml.raw(item['style'])
+        xml.element('mapTip', item.get('mapTip', ''))
+        xml.element('dataUrl', item.get('dataUrl', ''), {'format': ""})
+        xml.end()
+
+    def write_properties(self, binding):
+        """Write project properties with WMS and WFS metadata.
+
+        :param dict binding: Dict for jinja
+        """
+        xml = self.xml
+        xml.start('properties')
+        xml.raw(PROPERTIES_LEGEND)
+
+        xml.start('Gui')
+        for part in ['Red', 'Green', 'Blue']:
+            xml.element(
+                'CanvasColor%sPart' % part, 255, {'type': "int"})
+        selection_color = binding.get('selection_color')
+        for i, part in enumerate(['Red', 'Green', 'Blue', 'Alpha']):
+            xml.element(
+                'SelectionColor%sPart' % part, selection_color[i],
+                {'type': "int"})
+        xml.end()
+
+        xml.raw(PROPERTIES_DEFAULTS)
+
+        for tag, key in [
+            ('WMSServiceTitle', 'wms_service_title'),
+            ('WMSServiceAbstract', 'wms_service_abstract')
+        ]:
+            xml.element(tag, binding.get(key, ''), {'type': "QString"})
+
+        xml.start('WMSKeywordList', {'type': "QStringList"})
+        for keyword in binding.get('wms_keywords') or []:
+            xml.element('value', keyword)
+        xml.end()
+
+        for tag, key in [
+            ('WMSOnlineResource', 'wms_url'),
+            ('WMSContactPerson', 'wms_contact_person'),
+            ('WMSContactOrganization', 'wms_contact_organization'),
+            ('WMSContactPosition', 'wms_contact_position'),
+            ('WMSContactPhone', 'wms_contact_phone'),
+            ('WMSContactMail', 'wms_contact_mail'),
+            ('WMSFees', 'wms_fees'),
+            ('WMSAccessConstraints', 'wms_access_constraints'),
+            ('WMSRootName', 'wms_root_name')
+        ]:
+            xml.element(tag, binding.get(key, ''), {'type': "QString"})
+
+        xml.start('WMSCrsList', {'type': "QStringList"})
+        for crs in binding.get('wms_crs_list') or []:
+            xml.element('value', crs)
+        xml.end()
+
+        if binding.get('wms_extent') is not None:
+            xml.start('WMSExtent', {'type': "QStringList"})
+            for value in binding['wms_extent'][:4]:
+                xml.element('value', value)
+            xml.end()
+        if binding.get('wms_max_width'):
+            xml.element(
+                'WMSMaxWidth', binding['wms_max_width'], {'type': "int"})
+        if binding.get('wms_max_height'):
+            xml.element(
+                'WMSMaxHeight', binding['wms_max_height'], {'type': "int"})
+
+        xml.raw(PROPERTIES_WMS)
+
+        xml.element('WFSUrl', binding.get('wfs_url', ''), {'type': "QString"})
+        xml.start('WFSLayers', {'type': "QStringList"})
+        for layer_id in binding.get('wfs_layers', []):
+            xml.element('value', layer_id)
+        xml.end()
+
+        xml.raw(PROPERTIES_WMTS)
+        xml.end()
+
+
+class QgsFragments():
+    """QgsFragments class
+
+    Render layer fragments with QgsWriter, with the same interface as the
+    layer macros of the QGS template.
+    """
+
+    def render(self, write, item):
+        """Return XML written by write for a layer.
+
+        :param func write: QgsWriter method
+        :param dict item: QGS layer
+        """
+        stream = StringIO()
+        write(QgsWriter(stream), item)
+        return stream.getvalue().rstrip("\n")
+
+    def layer_tree_layer(self, item):
+        return self.render(QgsWriter.write_layer_tree_layer, item)
+
+    def legend_layer(self, item):
+        return self.render(QgsWriter.write_legend_layer, item)
+
+    def maplayer(self, item):
+        return self.render(QgsWriter.write_maplayer, item)
@@ -1,6 +1,13 @@
 import unittest
 
 from tests.capabilities_tests import *
+from tests.verifier_tests import *
+from tests.cache_tests import *
+from tests.render_tests import *
+from tests.async_tests import *
+from tests.delta_tests import *
+from tests.golden_tests import *
+from tests.benchmark_tests import *
 
 
 if __name__ == '__main__':
@@ -0,0 +1,125 @@
+from json2qgs import Json2Qgs, Logger
+from tests.utils import load_config, local_schema, offline_schema
+
+import unittest
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+
+logger = Logger("Json2QgsAsyncTest", logging.CRITICAL)
+
+
+class AsyncTest(unittest.TestCase):
+    """Test case for the async generation API"""
+
+    def setUp(self):
+        self.dest_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dest_path)
+
+    def create_generator(self, config_path, qgs_name):
+        """Create generator writing to the test destination path"""
+        return Json2Qgs(
+            load_config(config_path), logger, self.dest_path, '3', "qgs/",
+            qgs_name, verify=True
+        )
+
+    def test_generate_async(self):
+        """Test whether projects are generated concurrently."""
+        wms = self.create_generator(
+            "demo-config/qgsContentPrint.json", 'somap_print')
+        wfs = self.create_generator(
+            "demo-config/qgsContentWFS.json", 'somap_wfs')
+
+        async def generate():
+            return await asyncio.gather(
+                wms.generate_async('wms'),
+                wfs.generate_async('wfs', timeout=60)
+            )
+
+        with offline_schema():
+            paths = asyncio.run(generate())
+
+        self.assertEqual(paths, [
+            os.path.join(self.dest_path, 'somap_print.qgs'),
+            os.path.join(self.dest_path, 'somap_wfs.qgs')
+        ])
+        self.assertTrue(wms.verify_project(paths[0], False))
+        self.assertTrue(wfs.verify_project(paths[1], True))
+
+    def test_generate_async_timeout(self):
+        """Test whether a generation exceeding its timeout is stopped
+           without writing the project.
+        """
+        generator = self.create_generator(
+            "demo-config/qgsContentPrint.json", 'somap_print')
+
+        def slow_schema(url, *args, **kwargs):
+            time.sleep(0.5)
+            return local_schema(url)
+
+        with offline_schema(slow_schema):
+            with self.assertRaises(asyncio.TimeoutError):
+                asyncio.run(generator.generate_async('wms', timeout=0.1))
+
+        self.assertFalse(os.path.exists(
+            os.path.join(self.dest_path, 'somap_print.qgs')))
+
+    def test_generate_after_timeout(self):
+        """Test whether a generator is reusable after a timeout."""
+        generator = self.create_generator(
+            "demo-config/qgsContentPrint.json", 'somap_print')
+        qgs_path = os.path.join(self.dest_path, 'somap_print.qgs')
+
+        def slow_schema(url, *args, **kwargs):
+            time.sleep(0.5)
+            return local_schema(url)
+
+        with offline_schema(slow_schema):
+            with self.assertRaises(asyncio.TimeoutError):
+                asyncio.run(generator.generate_async('wms', timeout=0.1))
+
+        with offline_schema():
+            self.assertEqual(
+                asyncio.run(generator.generate_async('wms')), qgs_path)
+            os.remove(qgs_path)
+            generator.generate_wms_project()
+        self.assertTrue(os.path.exists(qgs_path))
+
+    def test_generate_async_timeout_while_writing(self):
+        """Test whether a project rendered in the background after a timeout
+           does not replace the QGS file.
+        """
+        generator = self.create_generator(
+            "demo-config/qgsContentPrint.json", 'somap_print')
+        render_project = generator.render_project
+
+        def slow_render(*args):
+            time.sleep(0.5)
+            render_project(*args)
+
+        generator.render_project = slow_render
+        with offline_schema():
+            with self.assertRaises(asyncio.TimeoutError):
+                asyncio.run(generator.generate_async('wms', timeout=0.3))
+
+        # the executor has been shut down, so rendering has completed
+        self.assertTrue(generator.cancelled)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.dest_path, 'somap_print.qgs')))
+        self.assertFalse(os.path.exists(
+            os.path.join(self.dest_path, 'somap_print.qgs.tmp')))
+
+    def test_generate_async_invalid(self):
+        """Test whether an invalid config returns no project."""
+        generator = self.create_generator(
+            "demo-config/qgsContentWFS.json", 'somap_wfs')
+        generator.config["layers"][0].pop("title")
+
+        with offline_schema():
+            self.assertIsNone(asyncio.run(generator.generate_async('wfs')))
@@ -0,0 +1,210 @@
+from json2qgs import Json2Qgs, Logger
+from tests.utils import canonical_xml, compress_config, local_schema, \
+    offline_schema, synthetic_config
+from xml.dom.minidom import parseString
+
+import unittest
+import base64
+import importlib.util
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+
+logger = Logger("Json2QgsBenchmarkTest", logging.CRITICAL)
+
+
+def best_time(func, repeat=3):
+    """Return best run time of func in seconds
+
+    Args:
+        func (callable): Function to benchmark
+        repeat (int): Number of runs
+
+    Returns:
+        float: Best run time in seconds
+    """
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def dom_aliases_style(xml, attributes):
+    """Reference implementation of the alias rewriting with DOM elements
+
+    Args:
+        xml (str): QML
+        attributes (list): Attributes with aliases
+
+    Returns:
+        str: Style with aliases
+    """
+    doc = parseString(xml)
+    qgis = doc.getElementsByTagName("qgis")[0]
+    aliases = qgis.getElementsByTagName("aliases")[0]
+    for alias in list(aliases.childNodes):
+        aliases.removeChild(alias)
+    for i, attribute in enumerate(attributes):
+        attr_alias = attribute.get("alias", "")
+        if attr_alias.startswith('{'):
+            attr_alias = json.loads(attr_alias).get('alias', attr_alias)
+        alias = doc.createElement("alias")
+        alias.setAttribute('field', attribute["name"])
+        alias.setAttribute('index', str(i))
+        alias.setAttribute('name', attr_alias)
+        aliases.appendChild(alias)
+
+    return "".join([node.toxml() for node in qgis.childNodes])
+
+
+class BenchmarkTest(unittest.TestCase):
+    """Benchmarks of optimised code paths on synthetic configs"""
+
+    def test_compressed_payload_benchmark(self):
+        """Benchmark size, load and validation of compressed payloads."""
+        config = synthetic_config(200)
+        schema = json.loads(local_schema(config["$schema"]).text)
+        generator = Json2Qgs(
+            config, logger, tempfile.gettempdir(), '3', "qgs/", 'somap')
+
+        variants = [('base64', config)]
+        variants.append(('gzip', compress_config(config, 'gzip')))
+        if importlib.util.find_spec('zstandard') is not None:
+            variants.append(('zstd', compress_config(config, 'zstd')))
+
+        results = {}
+        print("\nCompressed payloads (200 layers):")
+        for name, variant in variants:
+            content = json.dumps(variant)
+            load = best_time(lambda: json.loads(content))
+            validate = best_time(
+                lambda: generator.validate_schema(variant, schema=schema))
+            results[name] = len(content)
+            print(
+                "  %-6s size: %8.1f kB  load: %6.1f ms  validate: %6.1f ms" %
+                (name, len(content) / 1024, load * 1000, validate * 1000))
+
+        self.assertLess(results['gzip'], results['base64'] / 3)
+
+    def test_wfs_fast_benchmark(self):
+        """Benchmark WFS generation with full and minimal styles."""
+        config = synthetic_config(200)
+        config["layers"] = [
+            layer for layer in config["layers"]
+            if layer.get("type") != 'productset'
+        ]
+        dest_path = tempfile.mkdtemp()
+
+        results = {}
+        print("\nWFS project (200 layers):")
+        try:
+            for name, wfs_fast in [('full', False), ('fast', True)]:
+                generator = Json2Qgs(
+                    config, logger, dest_path, '3', "qgs/", name,
+                    wfs_fast=wfs_fast)
+                with offline_schema():
+                    duration = best_time(generator.generate_wfs_project)
+                size = os.path.getsize(
+                    os.path.join(dest_path, "%s.qgs" % name))
+                results[name] = duration
+                print(
+                    "  %-4s generate: %7.1f ms  size: %8.1f kB" %
+                    (name, duration * 1000, size / 1024))
+        finally:
+            shutil.rmtree(dest_path)
+
+        self.assertLess(results['fast'], results['full'])
+
+    def test_renderer_benchmark(self):
+        """Benchmark rendering of a large project with jinja and XML writer."""
+        config = synthetic_config(500)
+        dest_path = tempfile.mkdtemp()
+
+        results = {}
+        print("\nRender project (500 layers):")
+        try:
+            for renderer in ['jinja', 'xml']:
+                generator = Json2Qgs(
+                    config, logger, dest_path, '3', "qgs/", renderer,
+                    renderer=renderer)
+                layers_lookup = generator.prune_unreachable_layers()
+                layertree = [
+                    generator.collect_nested_layer(name, layers_lookup)
+                    for name in generator.wms_top_layers
+                ]
+                binding = generator.collect_wms_metadata(
+                    config["wms_metadata"], layertree)
+                qgis_template = generator.load_template(
+                    generator.qgs_template_fn)
+
+                def render():
+                    with open(os.devnull, 'w', encoding='utf-8') as f:
+                        generator.render_project(qgis_template, binding, f)
+
+                duration = best_time(render)
+                tracemalloc.start()
+                render()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                results[renderer] = duration
+                print(
+                    "  %-5s render: %6.1f ms  peak memory: %7.1f kB" %
+                    (renderer, duration * 1000, peak / 1024))
+        finally:
+            shutil.rmtree(dest_path)
+
+        self.assertLess(results['xml'], results['jinja'])
+
+    def test_alias_table_benchmark(self):
+        """Benchmark alias rewriting of attribute-heavy layers."""
+        config = synthetic_config(20, attributes_per_layer=500)
+        generator = Json2Qgs(
+            config, logger, tempfile.gettempdir(), '3', "qgs/", 'somap')
+        layers = [
+            (base64.b64decode(layer["qml_base64"]).decode(),
+             layer["attributes"])
+            for layer in config["layers"] if "attributes" in layer
+        ]
+
+        variants = [
+            ('dom', lambda qml, attributes: dom_aliases_style(
+                qml, attributes)),
+            ('table', lambda qml, attributes: generator.parse_qml_style(
+                qml, attributes)["style"])
+        ]
+
+        results = {}
+        styles = {}
+        print("\nAlias rewriting (20 layers, 500 attributes):")
+        for name, parse in variants:
+            def run():
+                return [parse(qml, attributes) for qml, attributes in layers]
+
+            duration = best_time(run)
+            tracemalloc.start()
+            styles[name] = run()
+            size, peak = tracemalloc.get_traced_memory()
+            blocks = len(tracemalloc.take_snapshot().traces)
+            tracemalloc.stop()
+
+            results[name] = (duration, peak)
+            print(
+                "  %-5s %6.0f layers/s  peak memory: %7.1f kB  "
+                "live blocks: %d" % (
+                    name, len(layers) / duration, peak / 1024, blocks))
+
+        for dom_style, table_style in zip(styles['dom'], styles['table']):
+            self.assertEqual(
+                canonical_xml("<qgis>%s</qgis>" % table_style),
+                canonical_xml("<qgis>%s</qgis>" % dom_style))
+        self.assertLess(results['table'][0], results['dom'][0])
+        self.assertLess(results['table'][1], results['dom'][1])
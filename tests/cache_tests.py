@@ -0,0 +1,202 @@
+from json2qgs import Json2Qgs, Logger
+from tests.utils import load_config, offline_schema, styled_config, \
+    synthetic_config
+from unittest import mock
+
+import unittest
+import base64
+import logging
+import os
+import shutil
+import tempfile
+
+
+logger = Logger("Json2QgsCacheTest", logging.CRITICAL)
+
+
+class CacheTest(unittest.TestCase):
+    """Test case for caching of generation results"""
+
+    def setUp(self):
+        self.dest_path = tempfile.mkdtemp()
+        Json2Qgs.print_template_cache.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.dest_path)
+
+    def create_generator(self, config, qgs_name='somap_print'):
+        """Create generator writing to the test destination path"""
+        return Json2Qgs(
+            config, logger, self.dest_path, '3', "qgs/", qgs_name
+        )
+
+    def test_print_template_cache(self):
+        """Test whether print templates are decoded once across projects."""
+        config = load_config("demo-config/qgsContentPrint.json")
+
+        with offline_schema():
+            self.create_generator(config, 'print_a').generate_wms_project()
+            self.create_generator(config, 'print_b').generate_wms_project()
+
+        self.assertEqual(len(Json2Qgs.print_template_cache), 1)
+        for qgs_name in ['print_a', 'print_b']:
+            path = os.path.join(self.dest_path, "%s.qgs" % qgs_name)
+            with open(path, encoding='utf-8') as f:
+                self.assertIn('name="test_template"', f.read())
+
+    def test_malformed_print_template(self):
+        """Test whether a malformed print template is skipped."""
+        generator = self.create_generator(
+            load_config("demo-config/qgsContentPrint.json"))
+        template = base64.b64encode(b'<Layout><Broken></Layout>').decode()
+
+        self.assertIsNone(generator.decode_print_template(template))
+        self.assertIsNone(generator.decode_print_template(template))
+        self.assertEqual(len(Json2Qgs.print_template_cache), 1)
+
+    def test_print_template_cache_bounded(self):
+        """Test whether least recently used print templates are evicted."""
+        generator = self.create_generator(
+            load_config("demo-config/qgsContentPrint.json"))
+        templates = [
+            base64.b64encode(b'<Layout name="t%d"/>' % i).decode()
+            for i in range(4)
+        ]
+
+        with mock.patch.object(Json2Qgs, 'PRINT_TEMPLATE_CACHE_SIZE', 3):
+            for template in templates[:3]:
+                generator.decode_print_template(template)
+            # mark first template as recently used
+            generator.decode_print_template(templates[0])
+            generator.decode_print_template(templates[3])
+
+            self.assertEqual(len(Json2Qgs.print_template_cache), 3)
+            self.assertEqual(
+                [template for template, error in
+                 Json2Qgs.print_template_cache.values()],
+                ['<Layout name="t2"/>', '<Layout name="t0"/>',
+                 '<Layout name="t3"/>'])
+
+    def test_unchanged_asset_not_rewritten(self):
+        """Test whether unchanged assets are not written again."""
+        generator = self.create_generator(
+            load_config("demo-config/qgsContentPrint.json"))
+        asset_path = os.path.join(self.dest_path, 'logos', 'logo.png')
+        asset = base64.b64encode(b'logo').decode()
+
+        self.assertTrue(generator.save_asset(asset_path, asset))
+        self.assertFalse(generator.save_asset(asset_path, asset))
+        self.assertTrue(generator.save_asset(
+            asset_path, base64.b64encode(b'new logo').decode()))
+        with open(asset_path, 'rb') as f:
+            self.assertEqual(f.read(), b'new logo')
+
+    def test_fragment_cache(self):
+        """Test whether cached layer fragments are spliced into the project
+           and only changed layers are rendered again.
+        """
+        cache_dir = os.path.join(self.dest_path, 'cache')
+        config = styled_config("demo-config/qgsContentPrint.json")
+        qgs_path = os.path.join(self.dest_path, 'somap_print.qgs')
+
+        projects = []
+        generators = []
+        for i in range(3):
+            if i == 2:
+                # change a single layer
+                config["layers"][4]["title"] = "Grundstücke (geändert)"
+            generator = Json2Qgs(
+                config, logger, self.dest_path, '3', "qgs/", 'somap_print',
+                cache_dir=cache_dir
+            )
+            with offline_schema():
+                generator.generate_wms_project()
+            with open(qgs_path, encoding='utf-8') as f:
+                projects.append(f.read())
+            generators.append(generator)
+
+        # initial run renders all 6 layers
+        self.assertEqual(generators[0].fragment_cache_misses, 6)
+        self.assertEqual(generators[0].fragment_cache_hits, 0)
+        # unchanged run is identical, including the cached layer IDs
+        self.assertEqual(generators[1].fragment_cache_hits, 6)
+        self.assertEqual(projects[1], projects[0])
+        # only the changed layer is rendered again
+        self.assertEqual(generators[2].fragment_cache_misses, 1)
+        self.assertEqual(generators[2].fragment_cache_hits, 5)
+        self.assertIn("Grundstücke (geändert)", projects[2])
+        self.assertTrue(generators[2].verify_project(qgs_path, False))
+
+    def test_fragment_cache_shared_layer(self):
+        """Test whether a layer in multiple productsets gets its own layer
+           ID for each occurrence with a warm fragment cache.
+        """
+        cache_dir = os.path.join(self.dest_path, 'cache')
+        config = synthetic_config(12)
+        for layer in config["layers"]:
+            if layer["name"] == 'group_1':
+                layer["sublayers"].append("layer_2")
+        qgs_path = os.path.join(self.dest_path, 'somap.qgs')
+
+        for workers in [1, 2]:
+            generator = Json2Qgs(
+                config, logger, self.dest_path, '3', "qgs/", 'somap',
+                cache_dir=cache_dir, workers=workers
+            )
+            with offline_schema():
+                generator.generate_wms_project()
+            self.assertTrue(generator.verify_project(qgs_path, False))
+            with open(qgs_path, encoding='utf-8') as f:
+                self.assertEqual(
+                    f.read().count('<layername>layer_2</layername>'), 2)
+
+        # only the first occurrence is served from the cache
+        self.assertEqual(generator.fragment_cache_hits, 12)
+        self.assertEqual(generator.fragment_cache_misses, 0)
+
+    def test_fragment_cache_fallback_style(self):
+        """Test whether layers falling back to the default style are not
+           cached.
+        """
+        cache_dir = os.path.join(self.dest_path, 'cache')
+        config = synthetic_config(12)
+        qgs_path = os.path.join(self.dest_path, 'somap.qgs')
+
+        projects = []
+        for decode_failure in [True, False]:
+            generator = Json2Qgs(
+                config, logger, self.dest_path, '3', "qgs/", 'somap',
+                cache_dir=cache_dir
+            )
+            with offline_schema(), mock.patch.object(
+                    generator, 'get_qml_from_base64',
+                    side_effect=ValueError if decode_failure else
+                    generator.get_qml_from_base64):
+                generator.generate_wms_project()
+            self.assertEqual(generator.fragment_cache_misses, 12)
+            with open(qgs_path, encoding='utf-8') as f:
+                projects.append(f.read())
+
+        self.assertNotIn('synthetic="1"', projects[0])
+        self.assertIn('synthetic="1"', projects[1])
+
+    def test_fragment_cache_version(self):
+        """Test whether a new cache version invalidates cached fragments."""
+        cache_dir = os.path.join(self.dest_path, 'cache')
+        config = styled_config("demo-config/qgsContentPrint.json")
+
+        generators = []
+        for version in [1, 1, 2]:
+            with mock.patch.object(
+                    Json2Qgs, 'FRAGMENT_CACHE_VERSION', version):
+                generator = Json2Qgs(
+                    config, logger, self.dest_path, '3', "qgs/",
+                    'somap_print', cache_dir=cache_dir
+                )
+                with offline_schema():
+                    generator.generate_wms_project()
+            generators.append(generator)
+
+        self.assertEqual(generators[1].fragment_cache_hits, 6)
+        self.assertEqual(generators[2].fragment_cache_hits, 0)
+        self.assertEqual(generators[2].fragment_cache_misses, 6)
@@ -0,0 +1,234 @@
+from json2qgs import Json2Qgs, Logger
+from qgs_delta import QgsContentDelta
+from tests.utils import offline_schema, styled_config
+
+import unittest
+import copy
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+
+logger = Logger("Json2QgsDeltaTest", logging.CRITICAL)
+
+
+class DeltaTest(unittest.TestCase):
+    """Test case for regenerating projects from config deltas"""
+
+    def setUp(self):
+        self.dest_path = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.dest_path, 'cache')
+        self.qgs_path = os.path.join(self.dest_path, 'somap.qgs')
+
+    def tearDown(self):
+        shutil.rmtree(self.dest_path)
+
+    def generate(self, config, delta=None):
+        """Generate WMS project with fragment cache
+
+        Returns:
+            Json2Qgs: Generator
+        """
+        generator = Json2Qgs(
+            config, logger, self.dest_path, '3', "qgs/", 'somap',
+            cache_dir=self.cache_dir, delta=delta
+        )
+        with offline_schema():
+            generator.generate_wms_project()
+
+        return generator
+
+    def read_project(self):
+        with open(self.qgs_path, encoding='utf-8') as f:
+            return f.read()
+
+    def test_json_patch(self):
+        """Test whether a JSON Patch is applied without modifying the base
+           config and only changed layers are copied.
+        """
+        config = styled_config("demo-config/qgsContentPrint.json")
+        base = copy.deepcopy(config)
+
+        delta = QgsContentDelta([
+            {"op": "test", "path": "/layers/4/name",
+             "value": "mopublic_grundstueck"},
+            {"op": "replace", "path": "/layers/4/title", "value": "Neu"},
+            {"op": "copy", "from": "/layers/5", "path": "/layers/-"},
+            {"op": "replace", "path": "/layers/9/name", "value": "kopie"},
+            {"op": "remove", "path": "/layers/7"},
+            {"op": "add", "path": "/wms_top_layers/0", "value": "kopie"}
+        ])
+        patched = delta.apply(config)
+
+        self.assertEqual(config, base)
+        self.assertEqual(patched["layers"][4]["title"], "Neu")
+        self.assertEqual(patched["layers"][-1]["name"], "kopie")
+        self.assertEqual(patched["wms_top_layers"][0], "kopie")
+        # unchanged layers are shared with the base config
+        self.assertIs(patched["layers"][3], config["layers"][3])
+        self.assertEqual(delta.changed_layers, ["mopublic_grundstueck", "kopie"])
+        self.assertEqual(delta.removed_layers, ["1_hintergrundkarte_wms"])
+        self.assertEqual(delta.changed_keys, ["wms_top_layers"])
+        self.assertFalse(delta.reordered)
+
+        with self.assertRaises(ValueError):
+            QgsContentDelta([
+                {"op": "test", "path": "/layers/4/title", "value": "Alt"}
+            ]).apply(config)
+        with self.assertRaises(ValueError):
+            QgsContentDelta([
+                {"op": "remove", "path": "/layers/42"}
+            ]).apply(config)
+
+    def test_layers_delta(self):
+        """Test whether a changed layers delta replaces, adds and removes
+           layers by name.
+        """
+        config = styled_config("demo-config/qgsContentPrint.json")
+        layer = dict(config["layers"][4], title="Neu")
+        added = dict(config["layers"][5], name="neu")
+
+        delta = QgsContentDelta({
+            "layers": [layer, added],
+            "removed_layers": ["1_hintergrundkarte_wms"]
+        })
+        patched = delta.apply(config)
+
+        self.assertIs(patched["layers"][4], layer)
+        self.assertIs(patched["layers"][-1], added)
+        self.assertEqual(len(patched["layers"]), len(config["layers"]))
+        self.assertEqual(delta.changed_layers, ["mopublic_grundstueck", "neu"])
+        self.assertEqual(delta.removed_layers, ["1_hintergrundkarte_wms"])
+        self.assertEqual(delta.changed_keys, [])
+
+    def test_delta_generation(self):
+        """Test whether only layers changed by a delta are regenerated and
+           the result matches a full generation.
+        """
+        config = styled_config("demo-config/qgsContentPrint.json")
+        self.generate(config)
+        self.assertTrue(os.path.exists(
+            os.path.join(self.dest_path, 'somap.manifest.json')))
+
+        delta = QgsContentDelta([
+            {"op": "replace", "path": "/layers/4/title",
+             "value": "Grundstücke (geändert)"}
+        ])
+        patched = delta.apply(config)
+        generator = self.generate(patched, delta)
+        project = self.read_project()
+
+        self.assertEqual(generator.fragment_cache_misses, 1)
+        self.assertEqual(generator.fragment_cache_hits, 5)
+        self.assertIn("Grundstücke (geändert)", project)
+        self.assertTrue(generator.verify_project(self.qgs_path, False))
+
+        # full generation of patched config
+        self.generate(patched)
+        self.assertEqual(self.read_project(), project)
+
+        # invalid changed layer is reported
+        delta = QgsContentDelta([
+            {"op": "remove", "path": "/layers/4/datatype"}
+        ])
+        os.remove(self.qgs_path)
+        self.generate(delta.apply(patched), delta)
+        self.assertFalse(os.path.exists(self.qgs_path))
+
+    def test_consecutive_deltas(self):
+        """Test whether a delta is only applied incrementally to the config
+           of the previous generation.
+        """
+        config = styled_config("demo-config/qgsContentPrint.json")
+        self.generate(config)
+
+        first = QgsContentDelta([
+            {"op": "replace", "path": "/layers/4/title",
+             "value": "FIRST-DELTA"}
+        ])
+        patched = first.apply(config)
+        self.generate(patched, first)
+        self.assertIn("FIRST-DELTA", self.read_project())
+
+        # second delta against the original base config
+        second = QgsContentDelta([
+            {"op": "replace", "path": "/layers/3/title",
+             "value": "SECOND-DELTA"}
+        ])
+        generator = self.generate(second.apply(config), second)
+        project = self.read_project()
+        self.assertNotIn("FIRST-DELTA", project)
+        self.assertIn("SECOND-DELTA", project)
+        # full generation
+        self.assertIsNone(generator.delta_manifest)
+        self.assertEqual(generator.fragment_cache_misses, 1)
+        self.assertEqual(generator.fragment_cache_hits, 5)
+
+        # second delta against the config of the previous generation
+        self.generate(patched)
+        generator = self.generate(second.apply(patched), second)
+        project = self.read_project()
+        self.assertIn("FIRST-DELTA", project)
+        self.assertIn("SECOND-DELTA", project)
+        self.assertIsNotNone(generator.delta_manifest)
+        # only the changed layer is collected again
+        self.assertEqual(len(generator.known_cache_keys), 5)
+
+    def test_unaffected_project_skipped(self):
+        """Test whether projects not affected by a delta are not written."""
+        config = styled_config("demo-config/qgsContentPrint.json")
+        self.generate(config)
+        mtime = os.path.getmtime(self.qgs_path)
+
+        # unreachable layer
+        delta = QgsContentDelta({
+            "layers": [dict(config["layers"][5], name="unreachable")]
+        })
+        patched = delta.apply(config)
+        generator = self.generate(patched, delta)
+        self.assertEqual(generator.fragment_cache_misses, 0)
+        self.assertEqual(os.path.getmtime(self.qgs_path), mtime)
+
+        # layer becomes reachable
+        delta = QgsContentDelta([
+            {"op": "add", "path": "/wms_top_layers/-", "value": "unreachable"}
+        ])
+        generator = self.generate(delta.apply(patched), delta)
+        self.assertEqual(generator.fragment_cache_misses, 1)
+        self.assertIn('name="unreachable"', self.read_project())
+
+        with open(os.path.join(self.dest_path, 'somap.manifest.json')) as f:
+            self.assertIn("unreachable", json.load(f)["layers"])
+
+    def test_missing_manifest(self):
+        """Test whether the full project is generated without manifest."""
+        config = styled_config("demo-config/qgsContentPrint.json")
+        delta = QgsContentDelta({"layers": [config["layers"][4]]})
+
+        generator = self.generate(delta.apply(config), delta)
+        self.assertEqual(generator.fragment_cache_misses, 6)
+        self.assertTrue(os.path.exists(self.qgs_path))
+
+    def test_pruned_invalid_layer_made_reachable(self):
+        """Test whether a pruned, never validated layer is validated when a
+           delta makes it reachable.
+        """
+        config = styled_config("demo-config/qgsContentPrint.json")
+        config["layers"].append({"name": "invalid", "title": 5})
+        self.generate(config)
+        self.assertTrue(os.path.exists(self.qgs_path))
+
+        delta = QgsContentDelta([
+            {"op": "add", "path": "/wms_top_layers/-", "value": "invalid"}
+        ])
+        patched = delta.apply(config)
+        os.remove(self.qgs_path)
+        generator = self.generate(patched, delta)
+        self.assertFalse(os.path.exists(self.qgs_path))
+        self.assertEqual(generator.fragment_cache_misses, 0)
+
+        # same result as a full generation of the patched config
+        self.generate(patched)
+        self.assertFalse(os.path.exists(self.qgs_path))
@@ -0,0 +1,255 @@
+from json2qgs import Json2Qgs, Logger
+from qgs_delta import QgsContentDelta
+from tests.utils import compress_config, load_config, normalized_qgs, \
+    offline_schema, synthetic_config
+from collections import OrderedDict
+
+import unittest
+import asyncio
+import copy
+import importlib.util
+import logging
+import os
+import shutil
+import tempfile
+
+
+logger = Logger("Json2QgsGoldenTest", logging.CRITICAL)
+
+DEMO_CONFIG_DIR = "demo-config"
+# projects of the demo configs generated by json2qgs before the optimised
+# code paths, as <config>_<QGIS version>.qgs
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), 'golden')
+
+
+class GoldenTest(unittest.TestCase):
+    """Differential test of optimised code paths against the reference
+       generation
+
+    Each config is generated with the reference path (jinja renderer,
+    no cache, single process) and with each optimised mode. The projects
+    are compared canonically with layer IDs normalized, the saved assets
+    are compared byte by byte. For the demo configs, the reference path is
+    additionally compared with the checked-in golden projects.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        Json2Qgs.print_template_cache.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def generate(self, name, config, mode, qgis_version, runs=1,
+                 use_async=False, **kwargs):
+        """Generate project into its own destination dir
+
+        Args:
+            name (str): Name of destination dir
+            config (dict): json2qgs config
+            mode (str): Project type [wms | wfs]
+            qgis_version (str): QGIS version [2 | 3]
+            runs (int): Number of generations, e.g. to warm up caches
+            use_async (bool): Whether to use the async API
+
+        Returns:
+            tuple: Normalized QGS and assets by relative path
+        """
+        dest_path = os.path.join(self.tmp_dir, name)
+        os.makedirs(dest_path, exist_ok=True)
+
+        for i in range(runs):
+            generator = Json2Qgs(
+                config, logger, dest_path, qgis_version, "qgs/", 'somap',
+                **kwargs
+            )
+            with offline_schema():
+                if use_async:
+                    asyncio.run(generator.generate_async(mode))
+                elif mode == 'wfs':
+                    generator.generate_wfs_project()
+                else:
+                    generator.generate_wms_project()
+
+        return self.read_output(dest_path)
+
+    def read_output(self, dest_path):
+        """Read normalized project and assets from destination dir
+
+        Args:
+            dest_path (str): Destination dir
+
+        Returns:
+            tuple: Normalized QGS and assets by relative path
+        """
+        with open(os.path.join(dest_path, 'somap.qgs'),
+                  encoding='utf-8') as f:
+            qgs = normalized_qgs(f.read())
+
+        assets = {}
+        for root, dirs, files in os.walk(dest_path):
+            dirs[:] = [d for d in dirs if d != 'cache']
+            for filename in files:
+                if filename.startswith('somap.'):
+                    continue
+                path = os.path.join(root, filename)
+                with open(path, 'rb') as f:
+                    assets[os.path.relpath(path, dest_path)] = f.read()
+
+        return qgs, assets
+
+    def optimised_modes(self, config, qgis_version):
+        """Return optimised modes, which must give the reference output
+
+        Args:
+            config (dict): json2qgs config
+            qgis_version (str): QGIS version [2 | 3]
+
+        Returns:
+            list: Tuples of (name, config, generate kwargs)
+        """
+        cache_dir = os.path.join(self.tmp_dir, 'cache')
+        modes = [
+            ("cache (cold)", config, {
+                'cache_dir': os.path.join(cache_dir, 'cold')}),
+            ("cache (warm)", config, {
+                'cache_dir': os.path.join(cache_dir, 'warm'), 'runs': 2}),
+            ("workers", config, {'workers': 3}),
+            ("async", config, {'use_async': True}),
+            ("gzip", compress_config(config, 'gzip'), {})
+        ]
+        if importlib.util.find_spec('zstandard') is not None:
+            modes.append(("zstd", compress_config(config, 'zstd'), {}))
+        if qgis_version == '3':
+            modes += [
+                ("xml", config, {'renderer': 'xml'}),
+                ("xml + workers + cache", config, {
+                    'renderer': 'xml', 'workers': 3, 'runs': 2,
+                    'cache_dir': os.path.join(cache_dir, 'xml')})
+            ]
+
+        return modes
+
+    def check_config(self, config, mode, golden=None):
+        """Compare all optimised modes with the reference generation
+
+        Args:
+            config (dict): json2qgs config
+            mode (str): Project type [wms | wfs]
+            golden (str): Name of golden projects for the reference
+                generation
+        """
+        for qgis_version in ['2', '3']:
+            reference = self.generate(
+                "reference_%s" % qgis_version, config, mode, qgis_version)
+            if golden is not None:
+                with self.subTest(qgis_version=qgis_version, mode="golden"):
+                    golden_path = os.path.join(
+                        GOLDEN_DIR, "%s_%s.qgs" % (golden, qgis_version))
+                    with open(golden_path, encoding='utf-8') as f:
+                        self.assertEqual(
+                            reference[0], normalized_qgs(f.read()))
+            for name, variant, kwargs in self.optimised_modes(
+                    config, qgis_version):
+                with self.subTest(qgis_version=qgis_version, mode=name):
+                    qgs, assets = self.generate(
+                        "%s_%s" % (name, qgis_version), variant, mode,
+                        qgis_version, **kwargs)
+                    self.assertEqual(qgs, reference[0])
+                    self.assertEqual(assets, reference[1])
+
+    def test_demo_configs(self):
+        """Test optimised modes on all demo configs."""
+        for filename in sorted(os.listdir(DEMO_CONFIG_DIR)):
+            config = load_config(os.path.join(DEMO_CONFIG_DIR, filename))
+            mode = 'wfs' if 'wfs_metadata' in config else 'wms'
+            with self.subTest(config=filename):
+                self.check_config(
+                    config, mode, os.path.splitext(filename)[0])
+
+    def test_synthetic_wms_config(self):
+        """Test optimised modes on a large WMS config with multiple render
+           chunks, layers in multiple productsets and unreachable layers.
+        """
+        config = synthetic_config(
+            2 * Json2Qgs.RENDER_CHUNK_SIZE + 7, shared_layers=True)
+        config["layers"].append(OrderedDict([
+            ("name", "unreachable"), ("type", "productset"),
+            ("title", "Unreachable"), ("sublayers", ["layer_0"])
+        ]))
+        self.check_config(config, 'wms')
+
+    def test_synthetic_wfs_config(self):
+        """Test optimised modes on a large WFS config."""
+        config = synthetic_config(Json2Qgs.RENDER_CHUNK_SIZE + 7)
+        config["layers"] = [
+            layer for layer in config["layers"]
+            if layer.get("type") != 'productset'
+        ]
+        self.check_config(config, 'wfs')
+
+    def test_delta_mode(self):
+        """Test whether regenerating from a delta gives the reference
+           output of the patched config, including layers in multiple
+           productsets and pruned layers made reachable by the delta.
+        """
+        config = synthetic_config(30, shared_layers=True)
+        # pruned layers, the invalid layer is never validated
+        config["layers"].append(
+            dict(config["layers"][1], name="unreachable"))
+        config["layers"].append(
+            OrderedDict([("name", "invalid"), ("title", 5)]))
+        copied_index = len(config["layers"]) - 1
+
+        delta = [
+            {"op": "replace", "path": "/layers/2/title", "value": "Neu"},
+            {"op": "remove", "path": "/layers/5"},
+            {"op": "copy", "from": "/layers/7", "path": "/layers/-"},
+            {"op": "replace", "path": "/layers/%d/name" % copied_index,
+             "value": "kopie"},
+            {"op": "add", "path": "/layers/0/sublayers/-", "value": "kopie"},
+            {"op": "add", "path": "/wms_top_layers/-",
+             "value": "unreachable"}
+        ]
+        invalid_delta = [
+            {"op": "add", "path": "/wms_top_layers/-", "value": "invalid"}
+        ]
+        for qgis_version in ['2', '3']:
+            with self.subTest(qgis_version=qgis_version):
+                patched = QgsContentDelta(delta).apply(config)
+                reference = self.generate(
+                    "reference_%s" % qgis_version, patched, 'wms',
+                    qgis_version)
+
+                name = "delta_%s" % qgis_version
+                cache_dir = os.path.join(self.tmp_dir, 'cache', name)
+                self.generate(
+                    name, config, 'wms', qgis_version, cache_dir=cache_dir)
+                content_delta = QgsContentDelta(copy.deepcopy(delta))
+                patched = content_delta.apply(config)
+                qgs, assets = self.generate(
+                    name, patched, 'wms', qgis_version,
+                    cache_dir=cache_dir, delta=content_delta)
+                # NOTE: assets of removed layers are kept
+                self.assertEqual(qgs, reference[0])
+
+                # invalid layer made reachable fails validation like in a
+                # full generation, the previous project is kept
+                content_delta = QgsContentDelta(invalid_delta)
+                invalid = content_delta.apply(patched)
+                for dest, kwargs in [
+                    ("invalid_%s" % qgis_version, {}),
+                    (name, {'cache_dir': cache_dir, 'delta': content_delta})
+                ]:
+                    dest_path = os.path.join(self.tmp_dir, dest)
+                    os.makedirs(dest_path, exist_ok=True)
+                    generator = Json2Qgs(
+                        invalid, logger, dest_path, qgis_version, "qgs/",
+                        'somap', **kwargs)
+                    with offline_schema():
+                        generator.generate_wms_project()
+                self.assertFalse(os.path.exists(os.path.join(
+                    self.tmp_dir, "invalid_%s" % qgis_version, 'somap.qgs')))
+                self.assertEqual(
+                    self.read_output(os.path.join(self.tmp_dir, name))[0],
+                    reference[0])
@@ -0,0 +1,325 @@
+from json2qgs import Json2Qgs, Logger
+from tests.utils import canonical_xml, compress_config, load_config, \
+    local_schema, offline_schema, synthetic_config
+from collections import OrderedDict
+from unittest import mock
+
+import unittest
+import base64
+import importlib.util
+import itertools
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+
+logger = Logger("Json2QgsRenderTest", logging.CRITICAL)
+
+
+class RenderTest(unittest.TestCase):
+    """Test case for the rendering of qgis projects"""
+
+    def setUp(self):
+        self.dest_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dest_path)
+
+    def generate(self, config, mode, qgis_version, **kwargs):
+        """Generate a qgis project with deterministic layer IDs
+
+        Returns:
+            str: Generated QGS
+        """
+        counter = itertools.count()
+        generator = Json2Qgs(
+            config, logger, self.dest_path, qgis_version, "qgs/", 'somap',
+            **kwargs
+        )
+        with offline_schema(), mock.patch(
+                'json2qgs.uuid.uuid4',
+                side_effect=lambda: uuid.UUID(int=next(counter))):
+            if mode == 'wfs':
+                generator.generate_wfs_project()
+            else:
+                generator.generate_wms_project()
+
+        with open(os.path.join(self.dest_path, 'somap.qgs'),
+                  encoding='utf-8') as f:
+            return f.read()
+
+    def test_parallel_rendering(self):
+        """Test whether rendering on multiple workers is byte-identical to
+           the sequential rendering.
+        """
+        configs = [
+            ("demo-config/qgsContentPrint.json", 'wms'),
+            ("demo-config/qgsContentWFS.json", 'wfs')
+        ]
+        for (config_path, mode), qgis_version in itertools.product(
+                configs, ['2', '3']):
+            config = load_config(config_path)
+            self.assertEqual(
+                self.generate(config, mode, qgis_version, workers=2),
+                self.generate(config, mode, qgis_version)
+            )
+
+        # multiple chunks
+        config = synthetic_config(3 * Json2Qgs.RENDER_CHUNK_SIZE + 1)
+        self.assertEqual(
+            self.generate(config, 'wms', '3', workers=3),
+            self.generate(config, 'wms', '3')
+        )
+
+    def test_unreachable_layers_pruned(self):
+        """Test whether layers unreachable from the WMS top layers are
+           skipped for validation and generation.
+        """
+        config = load_config("demo-config/qgsContentPrint.json")
+        reference = self.generate(config, 'wms', '3')
+
+        # add unreferenced layers, one of them invalid
+        unreferenced = [
+            OrderedDict([
+                ("name", "unreferenced"), ("type", "productset"),
+                ("title", "Unreferenced"), ("sublayers", ["invalid"])
+            ]),
+            OrderedDict([("name", "invalid"), ("type", "layer")])
+        ]
+        config["layers"] = unreferenced + config["layers"]
+
+        generator = Json2Qgs(
+            config, logger, self.dest_path, '3', "qgs/", 'somap'
+        )
+        self.assertIsNotNone(generator.prune_unreachable_layers())
+        self.assertEqual(generator.pruned_layers, unreferenced)
+        self.assertEqual(self.generate(config, 'wms', '3'), reference)
+
+        # invalid layer is still reported once reachable
+        config["wms_top_layers"].append("unreferenced")
+        generator = Json2Qgs(
+            config, logger, self.dest_path, '3', "qgs/", 'somap_invalid'
+        )
+        with offline_schema():
+            generator.generate_wms_project()
+        self.assertFalse(os.path.exists(
+            os.path.join(self.dest_path, 'somap_invalid.qgs')))
+
+    def test_pruning_savings_exclude_download(self):
+        """Test whether the reported validation time of the reachable layers
+           does not include the schema download.
+        """
+        config = load_config("demo-config/qgsContentPrint.json")
+        config["layers"].append(
+            OrderedDict([("name", "unreferenced"), ("type", "layer")]))
+
+        def slow_schema(url, *args, **kwargs):
+            time.sleep(0.5)
+            return local_schema(url)
+
+        generator = Json2Qgs(
+            config, logger, self.dest_path, '3', "qgs/", 'somap'
+        )
+        with offline_schema(slow_schema), mock.patch.object(
+                generator, 'log_pruning_savings') as log_pruning_savings:
+            generator.generate_wms_project()
+
+        validation_duration = log_pruning_savings.call_args[0][1]
+        self.assertLess(validation_duration.total_seconds(), 0.5)
+
+    def test_compressed_payloads(self):
+        """Test whether gzip and zstd compressed QMLs, print templates and
+           assets give the same project and assets as uncompressed ones.
+        """
+        config = synthetic_config(5)
+        reference = self.generate(config, 'wms', '3')
+        self.assertIn('synthetic="1"', reference)
+        asset_path = os.path.join(
+            self.dest_path, 'layer_0', 'fillpattern', 'myCrossPattern.svg')
+        with open(asset_path, 'rb') as f:
+            asset = f.read()
+
+        compressions = ['gzip']
+        if importlib.util.find_spec('zstandard') is not None:
+            compressions.append('zstd')
+
+        for compression in compressions:
+            shutil.rmtree(self.dest_path)
+            os.makedirs(self.dest_path)
+
+            self.assertEqual(self.generate(
+                compress_config(config, compression), 'wms', '3'), reference)
+            with open(asset_path, 'rb') as f:
+                self.assertEqual(f.read(), asset)
+
+    def test_wfs_fast_mode(self):
+        """Test whether WFS fast mode writes only the aliases as style and
+           skips symbology and assets.
+        """
+        config = load_config("demo-config/qgsContentWFS.json")
+        project = self.generate(config, 'wfs', '3', wfs_fast=True)
+        self.assertIn(
+            '<aliases><alias field="gemeindename" index="0" '
+            'name="Gemeindename"/>', project)
+        self.assertNotIn('<renderer-v2', project)
+
+        config = synthetic_config(3)
+        config["layers"] = [
+            layer for layer in config["layers"]
+            if layer.get("type") != 'productset'
+        ]
+        project = self.generate(config, 'wfs', '3', wfs_fast=True)
+        generator = Json2Qgs(
+            config, logger, self.dest_path, '3', "qgs/", 'somap')
+        self.assertTrue(generator.verify_project(
+            os.path.join(self.dest_path, 'somap.qgs'), True))
+        self.assertNotIn('synthetic="1"', project)
+        self.assertIn('name="Attribute 0"', project)
+        self.assertIn('name="Attribute 1"', project)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.dest_path, 'layer_0')))
+
+    def test_xml_renderer(self):
+        """Test whether the XML writer gives a project equivalent to the
+           service_3.qgs template.
+        """
+        configs = [
+            ("demo-config/qgsContentPrint.json", 'wms'),
+            ("demo-config/qgsContentWMS.json", 'wms'),
+            ("demo-config/qgsContentWFS.json", 'wfs')
+        ]
+        for config_path, mode in configs:
+            config = load_config(config_path)
+            self.assertEqual(
+                canonical_xml(self.generate(
+                    config, mode, '3', renderer='xml')),
+                canonical_xml(self.generate(config, mode, '3'))
+            )
+
+        # pre-escaped values and rendering in chunks
+        config = synthetic_config(Json2Qgs.RENDER_CHUNK_SIZE + 1)
+        config["wms_metadata"]["root_title"] = "Root <0> & 'Co'"
+        reference = canonical_xml(self.generate(config, 'wms', '3'))
+        self.assertIn(
+            '<title>Root &lt;0&gt; &amp; \'Co\'</title>', reference)
+        self.assertIn('<title>Layer 0 &lt;0 &amp; "0"&gt;</title>', reference)
+        self.assertEqual(
+            canonical_xml(self.generate(config, 'wms', '3', renderer='xml')),
+            reference)
+        self.assertEqual(
+            canonical_xml(self.generate(
+                config, 'wms', '3', renderer='xml', workers=2,
+                cache_dir=os.path.join(self.dest_path, 'cache'))),
+            reference)
+
+        # values escaped by the XML writer
+        config["layers"][0]["title"] = "Group <0> & 'Co'"
+        config["wms_metadata"]["keywords"] = ["a & b", "<c>"]
+        project = canonical_xml(
+            self.generate(config, 'wms', '3', renderer='xml'))
+        self.assertIn("value=\"Group &lt;0> &amp; 'Co'\"", project)
+        self.assertIn("<value>a &amp; b</value>", project)
+        self.assertIn("<value>&lt;c&gt;</value>", project)
+
+    def test_size_aware_scheduling(self):
+        """Test whether layers are scheduled by estimated cost and collecting
+           them on multiple workers is byte-identical to the sequential
+           generation.
+        """
+        config = synthetic_config(12)
+        layers = {layer["name"]: layer for layer in config["layers"]}
+
+        # large QML
+        qml = base64.b64decode(layers["layer_7"]["qml_base64"])
+        layers["layer_7"]["qml_base64"] = base64.b64encode(qml.replace(
+            b'<qgis ', b'<!-- %s -->\n<qgis ' % (b'x' * 100000), 1)).decode()
+        # many assets
+        asset = layers["layer_3"]["qml_assets"][0]
+        layers["layer_3"]["qml_assets"] += [
+            dict(asset, path="fillpattern/pattern_%d.svg" % i)
+            for i in range(4)
+        ]
+        # layer in multiple productsets
+        layers["group_1"]["sublayers"].append("layer_2")
+
+        generator = Json2Qgs(
+            config, logger, self.dest_path, '3', "qgs/", 'somap')
+        order = [
+            layer["name"] for layer in generator.schedule_order([
+                layers["layer_%d" % i] for i in range(12)
+            ])
+        ]
+        self.assertEqual(order[:2], ["layer_7", "layer_3"])
+        self.assertEqual(
+            order[2:], ["layer_%d" % i for i in range(12) if i not in [3, 7]])
+
+        for qgis_version in ['2', '3']:
+            self.assertEqual(
+                self.generate(config, 'wms', qgis_version, workers=3),
+                self.generate(config, 'wms', qgis_version)
+            )
+        self.assertTrue(os.path.exists(
+            os.path.join(
+                self.dest_path, "layer_3", "fillpattern", "pattern_3.svg")))
+
+        config["layers"] = [
+            layer for layer in config["layers"]
+            if layer.get("type") != 'productset'
+        ]
+        self.assertEqual(
+            self.generate(config, 'wfs', '3', workers=3,
+                          cache_dir=os.path.join(self.dest_path, 'cache')),
+            self.generate(config, 'wfs', '3')
+        )
+
+    def test_progress_reporting(self):
+        """Test whether progress lines with ETA are logged while collecting
+           layers.
+        """
+        config = synthetic_config(5)
+        for workers in [1, 2]:
+            with mock.patch.object(Json2Qgs, 'PROGRESS_INTERVAL', 0), \
+                    mock.patch.object(logger, 'info') as info:
+                self.generate(config, 'wms', '3', workers=workers)
+            messages = [call.args[0] for call in info.call_args_list]
+            progress = [
+                msg for msg in messages if msg.startswith("Collected ")
+            ]
+            self.assertEqual(len(progress), 5, msg=workers)
+            self.assertTrue(progress[0].startswith("Collected 1/5 layers ("))
+            self.assertIn("ETA", progress[3])
+            self.assertTrue(progress[4].startswith("Collected 5 layers in "))
+
+    def test_xml_renderer_custom_template(self):
+        """Test whether a custom template is rendered with jinja instead of
+           the XML writer.
+        """
+        template_dir = os.path.join(self.dest_path, 'templates')
+        shutil.copytree("qgs/", template_dir)
+        config = load_config("demo-config/qgsContentWMS.json")
+
+        # copy of the bundled template
+        generator = Json2Qgs(
+            config, logger, self.dest_path, '3', template_dir, 'somap',
+            renderer='xml')
+        self.assertEqual(generator.renderer, 'xml')
+
+        template_path = os.path.join(template_dir, 'service_3.qgs')
+        with open(template_path, encoding='utf-8') as f:
+            template = f.read()
+        with open(template_path, 'w', encoding='utf-8') as f:
+            f.write(template.replace(
+                '<qgis ', '<!-- custom template -->\n<qgis ', 1))
+
+        generator = Json2Qgs(
+            config, logger, self.dest_path, '3', template_dir, 'somap',
+            renderer='xml')
+        self.assertEqual(generator.renderer, 'jinja')
+        with offline_schema():
+            generator.generate_wms_project()
+        with open(os.path.join(self.dest_path, 'somap.qgs'),
+                  encoding='utf-8') as f:
+            self.assertIn('<!-- custom template -->', f.read())
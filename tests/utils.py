@@ -0,0 +1,237 @@
+from collections import OrderedDict
+from json2qgs import Json2Qgs
+from unittest import mock
+from xml.etree.ElementTree import canonicalize
+
+import base64
+import copy
+import gzip
+import json
+import os
+import re
+import requests
+
+
+SCHEMAS_DIR = os.path.join(os.path.dirname(__file__), '..', 'schemas')
+
+
+def load_config(config_path):
+    """Load a json2qgs config with original order of keys
+
+    Args:
+        config_path (str): Json2Qgs config path
+
+    Returns:
+        dict: json2qgs config
+    """
+    with open(config_path) as f:
+        return json.load(f, object_pairs_hook=OrderedDict)
+
+
+def styled_config(config_path):
+    """Load a json2qgs config with decodable QMLs for all vector and raster
+    layers
+
+    The placeholder QMLs of the demo configs are replaced by the default
+    styles, so that no layer falls back to the default style.
+
+    Args:
+        config_path (str): Json2Qgs config path
+
+    Returns:
+        dict: json2qgs config
+    """
+    config = load_config(config_path)
+    for layer in config["layers"]:
+        if "postgis_datasource" in layer:
+            style = re.sub(
+                '^multi', "",
+                layer["postgis_datasource"]["geometry_type"].lower())
+        elif "raster_datasource" in layer:
+            style = "raster"
+        else:
+            continue
+
+        with open(os.path.join(
+                os.path.dirname(__file__), '..', 'qgs', '%s.qml' % style),
+                'rb') as f:
+            layer["qml_base64"] = base64.b64encode(f.read()).decode()
+
+    return config
+
+
+def canonical_xml(xml):
+    """Canonicalize XML without whitespace between elements
+
+    Args:
+        xml (str): XML document
+
+    Returns:
+        str: Canonical XML
+    """
+    return canonicalize(xml, strip_text=True)
+
+
+def normalized_qgs(xml):
+    """Canonicalize QGS and replace random layer IDs by their order of
+    appearance
+
+    Args:
+        xml (str): QGS document
+
+    Returns:
+        str: Canonical QGS with normalized layer IDs
+    """
+    layer_ids = {}
+
+    def replace(match):
+        return layer_ids.setdefault(
+            match.group(0), "layer-id-%d" % len(layer_ids))
+
+    return re.sub(
+        r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}",
+        replace, canonical_xml(xml))
+
+
+def local_schema(url, *args, **kwargs):
+    """Stand-in for requests.get serving JSON schemas from schemas/
+
+    Args:
+        url (str): Schema URL
+
+    Returns:
+        requests.Response: Response with local schema
+    """
+    response = requests.Response()
+    try:
+        with open(os.path.join(SCHEMAS_DIR, os.path.basename(url)),
+                  'rb') as f:
+            response._content = f.read()
+        response.status_code = 200
+    except OSError:
+        response._content = b''
+        response.status_code = 404
+
+    return response
+
+
+def offline_schema(side_effect=local_schema):
+    """Patch schema downloads to use the local schemas
+
+    Args:
+        side_effect (callable): Stand-in for the schema download
+
+    Returns:
+        mock._patch: Patch for use as decorator or context manager
+    """
+    return mock.patch.object(
+        Json2Qgs.http_session, 'get', side_effect=side_effect)
+
+
+def synthetic_config(num_layers, group_size=10, attributes_per_layer=10,
+                     shared_layers=False):
+    """Create a large WMS config from the demo print config
+
+    Single layers are copies of the demo vector layer with a copy of the
+    default polygon QML as style, grouped into productsets.
+
+    Args:
+        num_layers (int): Number of single layers
+        group_size (int): Number of layers per productset
+        attributes_per_layer (int): Number of attributes per layer
+        shared_layers (bool): Whether every fifth layer is also a sublayer
+            of the next productset
+
+    Returns:
+        dict: json2qgs config
+    """
+    config = load_config("demo-config/qgsContentPrint.json")
+    template = next(
+        layer for layer in config["layers"] if "qml_assets" in layer
+    )
+    with open(os.path.join(
+            os.path.dirname(__file__), '..', 'qgs', 'polygon.qml'),
+            'rb') as f:
+        # mark QML to distinguish it from the default polygon style
+        qml_base64 = base64.b64encode(
+            f.read().replace(b'<qgis ', b'<qgis synthetic="1" ', 1)
+        ).decode()
+
+    layers = []
+    top_layers = []
+    for i in range(num_layers):
+        if i % group_size == 0:
+            group = OrderedDict([
+                ("name", "group_%d" % (i // group_size)),
+                ("type", "productset"),
+                ("title", "Group %d" % (i // group_size)),
+                ("sublayers", [])
+            ])
+            layers.append(group)
+            top_layers.append(group["name"])
+
+        layer = copy.deepcopy(template)
+        layer["name"] = "layer_%d" % i
+        layer["title"] = "Layer %d <%d & \"%d\">" % (i, i, i)
+        layer["qml_base64"] = qml_base64
+        layer["attributes"] = [
+            OrderedDict([
+                ("name", "attribute_%d" % j),
+                ("alias", "Attribute %d" % j if j % 2 else
+                 '{"alias": "Attribute %d", "json_attribute": true}' % j)
+            ])
+            for j in range(attributes_per_layer)
+        ]
+        layers.append(layer)
+        group["sublayers"].append(layer["name"])
+
+    if shared_layers:
+        groups = [
+            layer for layer in layers if layer.get("type") == 'productset'
+        ]
+        for i in range(0, num_layers, 5):
+            group = groups[(i // group_size + 1) % len(groups)]
+            group["sublayers"].append("layer_%d" % i)
+
+    config["wms_top_layers"] = top_layers
+    config["layers"] = layers
+
+    return config
+
+
+def compress_config(config, compression):
+    """Compress all QMLs, print templates and assets in a config
+
+    Args:
+        config (dict): json2qgs config
+        compression (str): Compression [gzip | zstd]
+
+    Returns:
+        dict: json2qgs config with compressed payloads
+    """
+    if compression == 'gzip':
+        compress = gzip.compress
+    else:
+        import zstandard
+        compress = zstandard.ZstdCompressor().compress
+
+    def recode(base64_data):
+        return base64.b64encode(
+            compress(base64.b64decode(base64_data))).decode()
+
+    config = copy.deepcopy(config)
+    for layer in config["layers"]:
+        if "qml_base64" in layer:
+            layer["qml_base64"] = recode(layer["qml_base64"])
+            layer["qml_compression"] = compression
+        for asset in layer.get("qml_assets", []):
+            asset["base64"] = recode(asset["base64"])
+            asset["compression"] = compression
+    for template in config.get("print_templates", []):
+        template["template_base64"] = recode(template["template_base64"])
+        template["template_compression"] = compression
+        for asset in template.get("template_assets", []):
+            asset["base64"] = recode(asset["base64"])
+            asset["compression"] = compression
+
+    return config
@@ -0,0 +1,93 @@
+from json2qgs import Json2Qgs, Logger
+from tests.utils import load_config, offline_schema
+
+import unittest
+import logging
+import os
+import re
+import shutil
+import tempfile
+
+
+logger = Logger("Json2QgsVerifierTest", logging.CRITICAL)
+
+
+class VerifierTest(unittest.TestCase):
+    """Test case for the offline verification of generated qgis projects"""
+
+    def setUp(self):
+        self.dest_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dest_path)
+
+    def generate(self, config_path, mode, qgis_version, qgs_name):
+        """Generate a qgis project and return generator and QGS path"""
+        generator = Json2Qgs(
+            load_config(config_path),
+            logger,
+            self.dest_path,
+            qgis_version,
+            "qgs/",
+            qgs_name
+        )
+        with offline_schema():
+            if mode == 'wfs':
+                generator.generate_wfs_project()
+            else:
+                generator.generate_wms_project()
+
+        return generator, os.path.join(self.dest_path, "%s.qgs" % qgs_name)
+
+    def test_generated_projects_are_valid(self):
+        """Test whether generated demo projects pass the verification."""
+        for qgis_version in ['2', '3']:
+            generator, qgs_path = self.generate(
+                "demo-config/qgsContentPrint.json", 'wms', qgis_version,
+                'somap_print')
+            self.assertTrue(generator.verify_project(qgs_path, False))
+
+            generator, qgs_path = self.generate(
+                "demo-config/qgsContentWFS.json", 'wfs', qgis_version,
+                'somap_wfs')
+            self.assertTrue(generator.verify_project(qgs_path, True))
+
+    def test_missing_layer(self):
+        """Test whether a missing map layer is detected."""
+        generator, qgs_path = self.generate(
+            "demo-config/qgsContentPrint.json", 'wms', '3', 'somap_print')
+
+        with open(qgs_path, encoding='utf-8') as f:
+            qgs = f.read()
+        # remove first map layer
+        qgs = re.sub(r'<maplayer .*?</maplayer>', '', qgs, count=1,
+                     flags=re.DOTALL)
+        with open(qgs_path, 'w', encoding='utf-8') as f:
+            f.write(qgs)
+
+        self.assertFalse(generator.verify_project(qgs_path, False))
+
+    def test_missing_asset(self):
+        """Test whether a missing asset is detected."""
+        generator, qgs_path = self.generate(
+            "demo-config/qgsContentPrint.json", 'wms', '3', 'somap_print')
+        self.assertTrue(generator.verify_project(qgs_path, False))
+
+        os.remove(os.path.join(self.dest_path, 'logos/myPrintLogo.png'))
+        self.assertFalse(generator.verify_project(qgs_path, False))
+
+    def test_unreachable_layer_without_name(self):
+        """Test whether the verification ignores invalid unreachable
+           layers, which are pruned before validation.
+        """
+        config = load_config("demo-config/qgsContentPrint.json")
+        config["layers"].append({"title": "x"})
+        generator = Json2Qgs(
+            config, logger, self.dest_path, '3', "qgs/", 'somap_print',
+            verify=True
+        )
+        with offline_schema():
+            generator.generate_wms_project()
+
+        qgs_path = os.path.join(self.dest_path, 'somap_print.qgs')
+        self.assertTrue(generator.verify_project(qgs_path, False))